@@ -1,33 +1,65 @@
 from django.contrib import admin
-from .models import Post, Group, Comment, Follow
+from .models import Post, Group, Comment, Follow, Task
+from .pagination import EstimatedCountPaginator
+from .search import match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ("pk", "text", "pub_date", "author",)
+    list_select_related = ("author",)
     search_fields = ("text",)
     list_filter = ("pub_date",)
+    autocomplete_fields = ("author", "group",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        if not match_expression(search_term):
+            # в запросе одни знаки препинания: MATCH '' — ошибка FTS5
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "description",)
     search_fields = ("title", "description",)
-    list_filter = ("title",)
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ("pk", "author", "post", "text",)
-    search_fields = ("author", "post",)
-    list_filter = ("created", "author",)
+    list_select_related = ("author", "post__author", "post__group",)
+    search_fields = ("=author__username",)
+    list_filter = ("created",)
+    autocomplete_fields = ("author",)
+    raw_id_fields = ("post",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("user", "author",)
-    search_fields = ("user", "author",)
-    list_filter = ("user", "author",)
+    list_select_related = ("user", "author",)
+    search_fields = ("=user__username", "=author__username",)
+    autocomplete_fields = ("user", "author",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("pk", "name", "status", "priority", "attempts",
+                    "available_at",)
+    list_filter = ("status", "name",)
+    search_fields = ("=dedup_key",)
+    ordering = ("-pk",)
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,170 @@
+"""Read-only JSON API лент для мобильных клиентов.
+
+Ленты листаются курсорами ``?after=``/``?before=`` как и HTML-версии.
+``ETag`` и ``Last-Modified`` считаются по записям страницы — самому
+свежему посту и комментарию к ним — и по версии и отметке изменения
+ленты из ``feed_cache``, которые меняются при правке и удалении постов.
+Неизменившаяся страница отдаётся как 304 без сериализации. Ответ
+собирается потоком, по записи за раз.
+"""
+import hashlib
+import json
+import math
+
+from django.db.models import OuterRef, Subquery
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import feed_cache, timeline
+from .models import Comment, Group, Post, User
+from .pagination import COMMENTS_PER_PAGE, PER_PAGE, CursorPaginator
+
+MAX_LIMIT = 100
+
+
+def _limit(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        return default
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _page(request, queryset, date_field='pub_date', per_page=PER_PAGE,
+          id_field='pk', load=None):
+    paginator = CursorPaginator(queryset, _limit(request, per_page),
+                                date_field=date_field, id_field=id_field)
+    page = paginator.get_page(after=request.GET.get('after'),
+                              before=request.GET.get('before'))
+    if load is not None:
+        page.object_list = load(page.object_list)
+    return page
+
+
+def _timestamp(value):
+    return math.ceil(value.timestamp()) if value else 0
+
+
+def _with_last_comment(posts):
+    latest = (Comment.objects.filter(post=OuterRef('pk'))
+              .order_by('-created').values('created')[:1])
+    return posts.annotate(last_comment=Subquery(latest))
+
+
+def _post_modified(post):
+    return max(_timestamp(post.pub_date), _timestamp(post.last_comment))
+
+
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'image': post.thumbnail_url or (post.image.url if post.image else
+                                        None),
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def _stream(head, items, serialize, tail):
+    """Собрать JSON-объект по частям: ``head``, массив ``items``, ``tail``."""
+    head = json.dumps(head, ensure_ascii=False)
+    yield head[:-1] + (', ' if head != '{}' else '') + '"results": ['
+    for number, item in enumerate(items):
+        yield (', ' if number else '') + json.dumps(serialize(item),
+                                                    ensure_ascii=False)
+    yield '], ' + json.dumps(tail, ensure_ascii=False)[1:]
+
+
+def _respond(request, scopes, page, serialize, modified, head=None,
+             private=False):
+    ids = ','.join(str(item.pk) for item in page)
+    signature = f'{feed_cache.version(*scopes)}:{ids}:{modified}'
+    etag = quote_etag(hashlib.md5(signature.encode()).hexdigest())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified or None)
+    if response is None:
+        tail = {'next': page.next_cursor or None,
+                'previous': page.previous_cursor or None}
+        response = StreamingHttpResponse(
+            _stream(head or {}, page, serialize, tail),
+            content_type='application/json')
+    response['ETag'] = etag
+    if modified:
+        response['Last-Modified'] = http_date(modified)
+    patch_cache_control(response, no_cache=True, private=private)
+    if private:
+        patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _modified(scopes, *timestamps):
+    """Время изменения ответа: самая свежая запись или отметка лент.
+
+    Удаления, переносы и правки не видны по датам записей страницы, их
+    отражает отметка изменения лент из ``feed_cache``.
+    """
+    return max([*timestamps, math.ceil(feed_cache.last_modified(*scopes))])
+
+
+def _feed(request, queryset, scopes, private=False, entries=None):
+    """Лента постов; с ``entries`` листаются записи ленты подписок."""
+    queryset = _with_last_comment(queryset)
+    if entries is None:
+        page = _page(request, queryset)
+    else:
+        page = _page(request, entries, id_field='post_id',
+                     load=lambda rows: timeline.page_posts(rows, queryset))
+    modified = _modified(scopes, *(_post_modified(post) for post in page))
+    return _respond(request, scopes, page, serialize_post, modified,
+                    private=private)
+
+
+def index(request):
+    return _feed(request, Post.objects.for_feed(), ['index'])
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed(request, group.posts_group.for_feed(),
+                 [f'group:{group.pk}'])
+
+
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed(request, author.posts.for_feed(), [f'author:{author.pk}'])
+
+
+def follow_index(request):
+    viewer = request.user
+    if not viewer.is_authenticated:
+        return JsonResponse({'detail': 'Требуется вход'}, status=401)
+    return _feed(request, Post.objects.for_feed(),
+                 [f'follower:{viewer.pk}'], private=True,
+                 entries=timeline.entries(viewer))
+
+
+def post_view(request, username, post_id):
+    """Пост и страница его комментариев от новых к старым."""
+    post = get_object_or_404(_with_last_comment(Post.objects.for_feed()),
+                             author__username=username, id=post_id)
+    page = _page(request, post.comments.select_related('author'),
+                 date_field='created', per_page=COMMENTS_PER_PAGE)
+    scopes = [f'author:{post.author_id}']
+    return _respond(request, scopes, page, serialize_comment,
+                    _modified(scopes, _post_modified(post)),
+                    head={'post': serialize_post(post)})
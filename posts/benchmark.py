@@ -0,0 +1,161 @@
+import math
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.urls.resolvers import get_resolver
+
+from .models import Follow, Group, Post, User
+
+URLCONFS = ('posts.urls', 'users.urls')
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'sql_ms', 'bytes')
+
+
+def named_routes(urlconfs=URLCONFS):
+    """Вернуть (имя, параметры) для всех именованных маршрутов urlconf."""
+    routes = []
+    for urlconf in urlconfs:
+        for pattern in get_resolver(urlconf).url_patterns:
+            if isinstance(pattern, URLResolver) or not pattern.name:
+                continue
+            assert isinstance(pattern, URLPattern)
+            routes.append((pattern.name,
+                           list(pattern.pattern.regex.groupindex)))
+    return routes
+
+
+def sample_objects():
+    """Подобрать для маршрутов «тяжёлые» объекты: самые активные автор,
+    сообщество и пост, чтобы замеры шли по худшему случаю."""
+    author = (User.objects.annotate(total=Count('posts'))
+              .order_by('-total', 'pk').first())
+    group = (Group.objects.annotate(total=Count('posts_group'))
+             .order_by('-total', 'pk').first())
+    post = (Post.objects.filter(author=author)
+            .annotate(total=Count('comments'))
+            .order_by('-total', '-pk').first())
+    reader = (User.objects.exclude(pk=getattr(author, 'pk', None))
+              .annotate(total=Count('follower'))
+              .order_by('-total', 'pk').first())
+    return {'author': author, 'group': group, 'post': post,
+            'reader': reader}
+
+
+def route_url(name, params, objects):
+    values = {
+        'username': objects['author'].username,
+        'slug': objects['group'].slug if objects['group'] else None,
+        'post_id': objects['post'].pk if objects['post'] else None,
+    }
+    kwargs = {param: values[param] for param in params}
+    if None in kwargs.values():
+        return None
+    url = reverse(name, kwargs=kwargs)
+    if name == 'search':
+        text = objects['post'].text if objects['post'] else ''
+        url += '?q=' + (text.split() or ['a'])[0]
+    return url
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def measure(client, url, iterations, cold=False):
+    latencies = []
+    queries = []
+    sql_times = []
+    size = 0
+    client.get(url)
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        sql_times.append(sum(float(query['time']) * 1000
+                             for query in captured.captured_queries))
+        size = len(response.content)
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries': max(queries),
+        'sql_ms': round(percentile(sql_times, 0.50), 3),
+        'bytes': size,
+    }
+
+
+def run(iterations=20, cold=False, routes=None):
+    """Замерить маршруты для анонима и для залогиненного читателя.
+
+    Все запросы — GET, поэтому add_comment только перенаправляет, а
+    follow/unfollow меняют подписку читателя; после прогона она
+    возвращается в исходное состояние.
+    """
+    objects = sample_objects()
+    if objects['author'] is None or objects['reader'] is None:
+        return {}
+    followed = Follow.objects.filter(user=objects['reader'],
+                                     author=objects['author']).exists()
+    anonymous = Client()
+    reader = Client()
+    reader.force_login(objects['reader'])
+    author = Client()
+    author.force_login(objects['author'])
+    results = {}
+    for name, params in routes or named_routes():
+        url = route_url(name, params, objects)
+        if url is None:
+            continue
+        # редактирование доступно только автору поста
+        logged_in = author if name == 'post_edit' else reader
+        results[name] = {
+            'url': url,
+            'anonymous': measure(anonymous, url, iterations, cold),
+            'logged_in': measure(logged_in, url, iterations, cold),
+        }
+    restore = 'profile_follow' if followed else 'profile_unfollow'
+    reader.get(reverse(restore, args=[objects['author'].username]))
+    return results
+
+
+def compare(results, baseline, threshold, slack_ms=1.0):
+    """Вернуть список регрессий относительно сохранённого прогона.
+
+    Время сравнивается с допуском ``threshold`` (доля) плюс ``slack_ms``,
+    чтобы шум на быстрых страницах не ронял прогон; число запросов и
+    размер ответа не должны расти больше чем на ``threshold``.
+    """
+    regressions = []
+    for dataset, routes in results.items():
+        for name, clients in routes.items():
+            for client, metrics in clients.items():
+                if client == 'url':
+                    continue
+                old = (baseline.get(dataset, {}).get(name, {})
+                       .get(client))
+                if not old:
+                    continue
+                if metrics['status'] != old['status']:
+                    regressions.append(
+                        f'{dataset} {name} {client} status: '
+                        f'{old["status"]} -> {metrics["status"]}')
+                for metric in METRICS:
+                    limit = old[metric] * (1 + threshold)
+                    if metric.endswith('_ms'):
+                        limit += slack_ms
+                    if metrics[metric] > limit:
+                        regressions.append(
+                            f'{dataset} {name} {client} {metric}: '
+                            f'{old[metric]} -> {metrics[metric]}')
+    return regressions
@@ -0,0 +1,87 @@
+"""Кеш HTML-карточек постов, общий для всех лент и зрителей.
+
+Карточка хранится под id поста и версией его содержимого — хешем всех
+полей, которые она показывает: текста, картинки, сообщества, числа
+комментариев. Правка поста, новый комментарий или смена сообщества
+меняют версию, и карточка перерисовывается сама, без сброса по
+сигналам; старая просто истекает. Лента собирается из одного
+``get_many`` карточек своей страницы.
+
+Кнопка «Редактировать» зависит от зрителя, поэтому в кешированном HTML
+на её месте стоит метка, которую ``personalize`` заменяет для автора.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'post_item.html'
+ACTIONS_TEMPLATE = 'post_actions.html'
+
+
+def actions_marker(post):
+    return f'<!-- post-actions:{post.pk} -->'
+
+
+def content_version(post):
+    group = post.group
+    parts = (post.text, post.pub_date.isoformat(), post.author.username,
+             group and f'{group.pk}:{group.slug}:{group.title}',
+             getattr(post, 'comments_count', None),
+             post.image.name if post.image else '', post.thumbnail,
+             post.thumbnail_width, post.thumbnail_height)
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def card_key(post):
+    return (f'post_card:{translation.get_language()}:{post.pk}:'
+            f'{content_version(post)}')
+
+
+def render_cards(posts):
+    """HTML карточек ``posts`` с метками вместо кнопок автора."""
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            cards[key] = missing[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'actions': actions_marker(post)})
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+    return ''.join(cards[key] for key in keys)
+
+
+def personalize(html, posts, user):
+    """Вставить кнопки автора в его карточки, остальные метки убрать."""
+    for post in posts:
+        actions = ''
+        if user is not None and user.pk == post.author_id:
+            actions = render_to_string(ACTIONS_TEMPLATE, {'post': post})
+        html = html.replace(actions_marker(post), actions)
+    return mark_safe(html)
+
+
+def page_key(*parts):
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode())
+    return f'post_cards:{translation.get_language()}:{digest.hexdigest()}'
+
+
+def render(posts, user, *key_parts, timeout=None):
+    """Карточки ``posts`` для ``user``.
+
+    С ``key_parts`` собранная страница ещё и сама кешируется на
+    ``timeout`` секунд — ключ должен включать версию ленты.
+    """
+    posts = list(posts)
+    if not key_parts:
+        return personalize(render_cards(posts), posts, user)
+    key = page_key(*key_parts)
+    html = cache.get(key)
+    if html is None:
+        html = render_cards(posts)
+        cache.set(key, html, timeout)
+    return personalize(html, posts, user)
@@ -0,0 +1,57 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import feed_cache
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class FeedValidators:
+    """``ETag`` и ``Last-Modified`` HTML-ленты по отметкам ``feed_cache``.
+
+    Отметки читаются из кеша, поэтому ответ 304 отдаётся до запросов
+    ленты::
+
+        validators = FeedValidators(request, 'index')
+        if validators.not_modified:
+            return validators.not_modified
+        ...
+        return validators.apply(render(request, 'index.html', context))
+
+    Страница залогиненного пользователя зависит от него самого, поэтому
+    его id входит в ETag, а ответ помечается как private.
+    """
+
+    def __init__(self, request, *scopes):
+        self.request = request
+        # по этим же лентам проверяется кеш страниц, см. page_cache
+        request.feed_scopes = scopes
+        self.modified = feed_cache.last_modified(*scopes)
+        # Last-Modified в целых секундах округляется вверх, чтобы не
+        # оказаться раньше самого изменения
+        self.last_modified = math.ceil(self.modified)
+        viewer = request.user.pk or 0
+        signature = f'{",".join(scopes)}:{self.modified!r}:{viewer}'
+        self.etag = quote_etag(hashlib.md5(signature.encode()).hexdigest())
+        self.not_modified = None
+        if request.method in SAFE_METHODS:
+            response = get_conditional_response(
+                request, etag=self.etag, last_modified=self.last_modified)
+            if response is not None:
+                self.not_modified = self.apply(response)
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        if self.request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True,
+                                max_age=settings.FEED_MAX_AGE)
+        patch_vary_headers(response, ['Cookie'])
+        return response
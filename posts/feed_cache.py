@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+from .tasks import task
+
+BATCH_SIZE = 1000
+
+
+def _key(scope):
+    return f'feed_version:{scope}'
+
+
+def version(*scopes):
+    """Вернуть текущую версию набора лент для ключей кеша фрагментов.
+
+    Сброс версии — это удаление её ключа: следующее чтение заводит новое
+    значение из текущего времени, так что старые фрагменты больше не
+    совпадают ни с одним ключом и просто истекают.
+    """
+    keys = [_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def _modified_key(scope):
+    return f'feed_modified:{scope}'
+
+
+def touch(*scopes):
+    """Запомнить время изменения лент для ``Last-Modified`` и ``ETag``."""
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def markers(*scopes):
+    """Отметки изменения лент в порядке ``scopes``, без запросов к базе.
+
+    Потерянная из кеша отметка заводится заново текущим временем: лента
+    считается изменившейся, а не наоборот.
+    """
+    keys = [_modified_key(scope) for scope in scopes]
+    marks = cache.get_many(keys)
+    for key in keys:
+        if key not in marks:
+            cache.add(key, time.time(), None)
+            marks[key] = cache.get(key) or time.time()
+    return [marks[key] for key in keys]
+
+
+def last_modified(*scopes):
+    return max(markers(*scopes))
+
+
+def bump(*scopes, modified=True):
+    """Сбросить версии лент и, если ``modified``, отметить их изменение.
+
+    При чтении с реплики версия сбрасывается ещё раз отложенной задачей
+    через ``REPLICA_MAX_LAG`` секунд: иначе фрагмент, собранный по
+    отстающей реплике сразу после записи, жил бы под новой версией до
+    следующей.
+    """
+    keys = [_key(scope) for scope in scopes]
+    cache.delete_many(keys)
+    if modified:
+        touch(*scopes)
+    if getattr(settings, 'REPLICA_DATABASE', None):
+        forget_versions.delay(keys, countdown=settings.REPLICA_MAX_LAG)
+
+
+@task(priority=5)
+def forget_versions(keys):
+    cache.delete_many(keys)
+
+
+def post_scopes(author_id, group_id=None):
+    scopes = ['index', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def bump_followers(user_ids):
+    batch = []
+    for user_id in user_ids:
+        batch.append(f'follower:{user_id}')
+        if len(batch) == BATCH_SIZE:
+            bump(*batch, modified=False)
+            batch = []
+    if batch:
+        bump(*batch, modified=False)
+
+
+def bump_author_followers(authors):
+    """Сбросить ленты подписчиков автора (id) или авторов (подзапрос)."""
+    if isinstance(authors, int):
+        authors = [authors]
+    follower_ids = (Follow.objects.filter(author_id__in=authors)
+                    .values_list('user_id', flat=True).distinct()
+                    .iterator(chunk_size=BATCH_SIZE))
+    bump_followers(follower_ids)
+
+
+@task(priority=5)
+def bump_author_followers_in_background(author_id):
+    bump_author_followers(author_id)
+
+
+def bump_author_followers_later(author_id):
+    """Сбросить ленты подписчиков автора фоновой задачей после коммита.
+
+    Обход подписчиков стоит O(подписчиков), поэтому правки постов и
+    комментарии не ждут его в запросе. Пока задача в очереди, ленты
+    подписок показывают прежнюю версию; повторные правки автора за это
+    время сливаются в одну задачу по ``dedup_key``.
+    """
+    bump_author_followers_in_background.delay(
+        author_id, dedup_key=f'followers:{author_id}')
@@ -1,5 +1,8 @@
 from .models import Post, Comment
 from django import forms
+from django.core.files.storage import default_storage
+from django.db import transaction
+from . import thumbnails
 
 
 class PostForm(forms.ModelForm):
@@ -15,6 +18,32 @@ class PostForm(forms.ModelForm):
                               'состоять только из пробелов',
                       'image': 'Загрузите сюда картинку', }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        rejection = getattr(self.files.get('image'), 'rejection', None)
+        if rejection:
+            self._errors.pop('image', None)
+            cleaned_data.pop('image', None)
+            self.add_error('image', rejection)
+        return cleaned_data
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        image_changed = 'image' in self.changed_data
+        old_thumbnail = post.thumbnail if image_changed else ''
+        if image_changed:
+            post.thumbnail = ''
+            post.thumbnail_width = post.thumbnail_height = None
+        if commit:
+            post.save()
+            self._save_m2m()
+            if old_thumbnail:
+                transaction.on_commit(
+                    lambda: default_storage.delete(old_thumbnail))
+            if image_changed and post.image:
+                thumbnails.schedule(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
 
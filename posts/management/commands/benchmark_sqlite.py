@@ -0,0 +1,130 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from posts.benchmark import percentile
+from posts.models import Comment, Post, User
+
+# как ведёт себя SQLite без настройки: журнал отката и ожидание
+# блокировки по умолчанию модуля sqlite3
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                   'busy_timeout': 5000}
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, number, deadline, write_ratio, post_ids, user_ids):
+        super().__init__()
+        self.rng = random.Random(number)
+        self.deadline = deadline
+        self.write_ratio = write_ratio
+        self.post_ids = post_ids
+        self.user_ids = user_ids
+        self.latencies = {'read': [], 'write': []}
+        self.locked = 0
+
+    def run(self):
+        try:
+            while time.monotonic() < self.deadline:
+                kind = ('write' if self.rng.random() < self.write_ratio
+                        else 'read')
+                started = time.perf_counter()
+                try:
+                    getattr(self, kind)()
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    self.locked += 1
+                    continue
+                self.latencies[kind].append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def read(self):
+        post_id = self.rng.choice(self.post_ids)
+        Post.objects.select_related('author', 'group').get(pk=post_id)
+        list(Comment.objects.filter(post_id=post_id)
+             .select_related('author')[:50])
+
+    def write(self):
+        Comment.objects.create(post_id=self.rng.choice(self.post_ids),
+                               author_id=self.rng.choice(self.user_ids),
+                               text='Комментарий из нагрузочного теста')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при параллельных '
+            'чтениях и записях без настройки и с SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        source = connection.settings_dict['NAME']
+        if connection.vendor != 'sqlite' or not os.path.exists(source):
+            raise CommandError('Нужна файловая база SQLite с данными, '
+                               'например после seed_yatube')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:10000])
+        user_ids = list(User.objects.values_list('pk', flat=True)[:10000])
+        if not (post_ids and user_ids):
+            raise CommandError('В базе нет постов или пользователей')
+
+        modes = (('по умолчанию', DEFAULT_PRAGMAS),
+                 ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS))
+        with tempfile.TemporaryDirectory() as directory:
+            for name, pragmas in modes:
+                copy = os.path.join(directory, 'bench.sqlite3')
+                self.copy_database(source, copy)
+                result = self.run_mode(copy, pragmas, options,
+                                       post_ids, user_ids)
+                self.report(name, result, options['seconds'])
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(copy + suffix):
+                        os.remove(copy + suffix)
+
+    def copy_database(self, source, target):
+        connections.close_all()
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+        src.close()
+        dst.close()
+
+    def run_mode(self, path, pragmas, options, post_ids, user_ids):
+        settings_dict = connection.settings_dict
+        original = settings_dict['NAME']
+        settings_dict['NAME'] = path
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                deadline = time.monotonic() + options['seconds']
+                workers = [Worker(number, deadline, options['write_ratio'],
+                                  post_ids, user_ids)
+                           for number in range(options['threads'])]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+        finally:
+            connections.close_all()
+            settings_dict['NAME'] = original
+        return workers
+
+    def report(self, name, workers, seconds):
+        line = [f'{name:15}']
+        for kind in ('read', 'write'):
+            latencies = [value for worker in workers
+                         for value in worker.latencies[kind]]
+            p95 = percentile(latencies, 0.95) * 1000 if latencies else 0
+            line.append(f'{kind}: {len(latencies) / seconds:8.1f}/с '
+                        f'p95={p95:6.1f}мс')
+        line.append(f'locked: {sum(worker.locked for worker in workers)}')
+        self.stdout.write('  '.join(line))
@@ -0,0 +1,104 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import benchmark
+
+DATASETS = {
+    'small': {'users': 100, 'groups': 5, 'posts': 1000,
+              'comments': 2000, 'follows': 500},
+    'medium': {'users': 1000, 'groups': 20, 'posts': 10000,
+               'comments': 20000, 'follows': 10000},
+    'large': {'users': 5000, 'groups': 50, 'posts': 100000,
+              'comments': 200000, 'follows': 50000},
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет все именованные маршруты на синтетических наборах '
+            'данных и сравнивает результат с сохранённым прогоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', default='small,medium',
+                            help='наборы через запятую: '
+                                 + ', '.join(DATASETS)
+                                 + '; current — текущая база как есть')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--cold', action='store_true',
+                            help='очищать кеш перед каждым запросом')
+        parser.add_argument('--data-dir',
+                            default=os.path.join(settings.BASE_DIR,
+                                                 'benchmarks'))
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='допустимый рост метрик, доля')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='записать результат в файл --baseline')
+
+    def handle(self, *args, **options):
+        names = [name for name in options['datasets'].split(',') if name]
+        unknown = set(names) - set(DATASETS) - {'current'}
+        if unknown:
+            raise CommandError(
+                f'Неизвестные наборы данных: {", ".join(sorted(unknown))}')
+
+        results = {}
+        for name in names:
+            if name != 'current':
+                self.use_dataset(name, options['data_dir'])
+            self.stdout.write(f'Замер набора {name}...')
+            results[name] = benchmark.run(options['iterations'],
+                                          cold=options['cold'])
+            self.print_table(results[name])
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+        baseline_path = options['baseline']
+        if not baseline_path:
+            return
+        if options['save_baseline']:
+            with open(baseline_path, 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Базовый прогон сохранён в {baseline_path}')
+            return
+        with open(baseline_path) as source:
+            baseline = json.load(source)
+        regressions = benchmark.compare(results, baseline,
+                                        options['threshold'])
+        if regressions:
+            raise CommandError('Регрессии производительности:\n'
+                               + '\n'.join(regressions))
+        self.stdout.write('Регрессий нет')
+
+    def use_dataset(self, name, data_dir):
+        """Переключить соединение на отдельный файл базы и досеять его."""
+        os.makedirs(data_dir, exist_ok=True)
+        connection = connections['default']
+        connection.close()
+        connection.settings_dict['NAME'] = os.path.join(
+            data_dir, f'{name}.sqlite3')
+        call_command('migrate', verbosity=0)
+        call_command('seed_yatube', stdout=self.stdout,
+                     **DATASETS[name])
+        cache.clear()
+
+    def print_table(self, routes):
+        for name, clients in routes.items():
+            for client in ('anonymous', 'logged_in'):
+                metrics = clients[client]
+                self.stdout.write(
+                    f'{name:18} {client:10} {metrics["status"]} '
+                    f'p50={metrics["p50_ms"]:.1f}ms '
+                    f'p95={metrics["p95_ms"]:.1f}ms '
+                    f'p99={metrics["p99_ms"]:.1f}ms '
+                    f'sql={metrics["queries"]}/{metrics["sql_ms"]:.1f}ms '
+                    f'{metrics["bytes"]}B')
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (get_pool, process_upload, store_thumbnail,
+                              thumbnail_name)
+
+
+class Command(BaseCommand):
+    help = ('Ужимает большие оригиналы и строит миниатюры для постов, '
+            'у которых их ещё нет')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--all', action='store_true',
+                            help='перестроить и уже готовые миниатюры')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            posts = posts.filter(thumbnail='')
+        last_id = 0
+        done = failed = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_id).order_by('pk')
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            futures = []
+            for post in batch:
+                try:
+                    name = thumbnail_name(post)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                futures.append((post, name, get_pool().submit(
+                    process_upload, post.image.path,
+                    default_storage.path(name), settings.THUMBNAIL_SIZE,
+                    settings.POST_IMAGE_MAX_SIDE)))
+            for post, name, future in futures:
+                try:
+                    size = future.result()
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                store_thumbnail(post.pk, name, size)
+                done += 1
+        self.stdout.write(f'Готово миниатюр: {done}, ошибок: {failed}')
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.search import FTS_TABLE
+
+SHADOW_TABLE = f'{FTS_TABLE}_new'
+
+
+def create_table(table):
+    return (f"CREATE VIRTUAL TABLE {table} USING fts5("
+            f"text, content='posts_post', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')")
+
+
+def indexed(table, row):
+    return f'EXISTS (SELECT 1 FROM {table}_docsize WHERE id = {row}.id)'
+
+
+def create_triggers(table):
+    """Триггеры, которые держат индекс ``table`` в синхронизации с постами.
+
+    Для теневой таблицы удаление и вставка проверяют, есть ли строка в
+    индексе: пока он заполняется, часть постов в него ещё не попала.
+    """
+    delete = (f"INSERT INTO {table}({table}, rowid, text) "
+              f"SELECT 'delete', old.id, old.text")
+    insert = f'INSERT INTO {table}(rowid, text) SELECT new.id, new.text'
+    if table == SHADOW_TABLE:
+        delete += f' WHERE {indexed(table, "old")}'
+        insert += f' WHERE NOT {indexed(table, "new")}'
+    return [
+        f'CREATE TRIGGER {table}_insert AFTER INSERT ON posts_post '
+        f'BEGIN {insert}; END',
+        f'CREATE TRIGGER {table}_delete AFTER DELETE ON posts_post '
+        f'BEGIN {delete}; END',
+        f'CREATE TRIGGER {table}_update AFTER UPDATE OF text ON posts_post '
+        f'BEGIN {delete}; {insert}; END',
+    ]
+
+
+def drop_triggers(table):
+    return [f'DROP TRIGGER IF EXISTS {table}_{event}'
+            for event in ('insert', 'delete', 'update')]
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает полнотекстовый индекс постов порциями в теневой '
+            'таблице и подменяет им текущий одной транзакцией')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def execute_all(self, cursor, statements):
+        for statement in statements:
+            cursor.execute(statement)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with connection.cursor() as cursor:
+            # поиск до подмены читает старый индекс целиком; правки постов
+            # во время перестройки триггеры пишут в оба индекса
+            with transaction.atomic():
+                # остатки прерванной перестройки
+                self.execute_all(cursor, drop_triggers(SHADOW_TABLE) + [
+                    f'DROP TABLE IF EXISTS {SHADOW_TABLE}'])
+                cursor.execute(create_table(SHADOW_TABLE))
+                self.execute_all(cursor, create_triggers(SHADOW_TABLE))
+            last_id = 0
+            total = 0
+            while True:
+                cursor.execute(
+                    'SELECT max(id), count(*) FROM ('
+                    'SELECT id FROM posts_post WHERE id > %s '
+                    'ORDER BY id LIMIT %s)', [last_id, batch_size])
+                max_id, count = cursor.fetchone()
+                if not count:
+                    break
+                with transaction.atomic():
+                    cursor.execute(
+                        f'INSERT INTO {SHADOW_TABLE}(rowid, text) '
+                        f'SELECT id, text FROM posts_post '
+                        f'WHERE id > %s AND id <= %s '
+                        f'AND id NOT IN (SELECT id FROM '
+                        f'{SHADOW_TABLE}_docsize)',
+                        [last_id, max_id])
+                last_id = max_id
+                total += count
+                self.stdout.write(f'Проиндексировано постов: {total}')
+            with transaction.atomic():
+                self.execute_all(cursor, drop_triggers(FTS_TABLE)
+                                 + drop_triggers(SHADOW_TABLE)
+                                 + [f'DROP TABLE {FTS_TABLE}'])
+                cursor.execute(f'ALTER TABLE {SHADOW_TABLE} '
+                               f'RENAME TO {FTS_TABLE}')
+                self.execute_all(cursor, create_triggers(FTS_TABLE))
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) "
+                           f"VALUES ('optimize')")
+        self.stdout.write(f'Индекс перестроен, постов: {total}')
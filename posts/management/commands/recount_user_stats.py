@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow, Post, User, UserStats
+from posts.stats import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = recount_all(User, Post, Follow, UserStats,
+                            batch_size=options['batch_size'])
+        self.stdout.write(f'Пересчитано пользователей: {total}')
@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.tasks import Worker
+
+
+def _work(stop, burst, poll_interval):
+    try:
+        Worker().run(stop, burst=burst, poll_interval=poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Запускает пул воркеров очереди задач; SIGTERM или Ctrl+C '
+            'дают им закончить текущие задачи')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.TASK_WORKERS)
+        parser.add_argument('--mode', choices=('thread', 'process'),
+                            default='thread',
+                            help='потоки для задач с ожиданием ввода-вывода, '
+                                 'процессы — для тяжёлых вычислений')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.TASK_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true',
+                            help='выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'process':
+            # дочерние процессы не должны делить соединения с родителем
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            start = context.Process
+        else:
+            stop = threading.Event()
+            start = threading.Thread
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        workers = [start(target=_work,
+                         args=(stop, options['burst'],
+                               options['poll_interval']))
+                   for _ in range(max(options['workers'], 1))]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Запущено воркеров: {len(workers)} '
+                          f'({options["mode"]})')
+        for worker in workers:
+            worker.join()
+        self.stdout.write('Воркеры остановлены')
@@ -0,0 +1,273 @@
+import bisect
+import os
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.stats import recount_all
+
+USER_PREFIX = 'seed_user_'
+GROUP_PREFIX = 'seed-group-'
+IMAGE_DIR = 'posts/seed'
+# даты отсчитываются от фиксированного момента, чтобы прогоны совпадали
+EPOCH = datetime(2020, 11, 15, tzinfo=timezone.utc)
+WORDS = (
+    'котик собака утро вечер город море книга музыка дорога работа '
+    'друзья праздник погода кофе чай поезд лес река горы снег солнце '
+    'фильм игра код проект идея встреча дом сад кухня ужин завтрак '
+    'прогулка путешествие фото новости вопрос ответ мысль история'
+).split()
+
+TIMELINE_SQL = '''
+INSERT OR IGNORE INTO posts_timelineentry (user_id, post_id, pub_date)
+SELECT f.user_id, r.id, r.pub_date
+FROM posts_follow f
+JOIN (SELECT id, author_id, pub_date,
+             ROW_NUMBER() OVER (PARTITION BY author_id
+                                ORDER BY pub_date DESC, id DESC) AS n
+      FROM posts_post) r ON r.author_id = f.author_id
+WHERE r.n <= %s
+'''
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволить bulk_create записать свои даты в auto_now_add поля."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def aware_datetime(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+class PowerLaw:
+    """Выбор индекса 0..n-1 с весом 1 / (ранг ** alpha)."""
+
+    def __init__(self, size, alpha, rng):
+        self.rng = rng
+        self.cumulative = list(accumulate(1 / (rank ** alpha)
+                                          for rank in range(1, size + 1)))
+
+    def pick(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return bisect.bisect_left(self.cumulative, point)
+
+
+class Command(BaseCommand):
+    help = ('Создаёт детерминированный синтетический набор данных: '
+            'пользователей, сообщества, посты, комментарии и подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=0,
+                            help='сколько разных картинок сгенерировать')
+        parser.add_argument('--image-ratio', type=float, default=0.1,
+                            help='доля постов с картинкой')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='показатель степенного распределения')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--now', type=aware_datetime, default=EPOCH,
+                            help='момент, от которого отсчитываются даты '
+                                 '(ISO 8601), по умолчанию '
+                                 f'{EPOCH.isoformat()}')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--grow', action='store_true',
+                            help='добавить строки к уже созданным, а не '
+                                 'дополнить набор до указанных размеров')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.now = options['now']
+
+        user_ids = self.seed_users()
+        group_ids = self.seed_groups()
+        images = self.seed_images()
+        post_ids = self.seed_posts(user_ids, group_ids, images)
+        self.seed_comments(user_ids, post_ids)
+        self.seed_follows(user_ids)
+
+        self.stdout.write('Пересчёт счётчиков и лент подписок...')
+        recount_all(User, Post, Follow, UserStats,
+                    batch_size=self.batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute(TIMELINE_SQL, [settings.TIMELINE_BACKFILL_SIZE])
+        cache.clear()
+        self.stdout.write('Готово')
+
+    def missing(self, name, existing):
+        wanted = self.options[name]
+        return wanted if self.options['grow'] else max(wanted - existing, 0)
+
+    def rng(self, name, offset):
+        return random.Random(f'{self.options["seed"]}:{name}:{offset}')
+
+    def insert(self, model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+
+    def report(self, name, created, total):
+        self.stdout.write(f'{name}: добавлено {created}, всего {total}')
+
+    def seed_users(self):
+        existing = User.objects.filter(username__startswith=USER_PREFIX)
+        start = existing.count()
+        count = self.missing('users', start)
+        password = make_password('password')
+        self.insert(User, (
+            User(username=f'{USER_PREFIX}{i}', password=password,
+                 first_name=f'Имя{i}', last_name=f'Фамилия{i}',
+                 date_joined=self.now)
+            for i in range(start, start + count)))
+        user_ids = array('q', existing.order_by('pk')
+                         .values_list('pk', flat=True))
+        self.report('Пользователи', count, len(user_ids))
+        return user_ids
+
+    def seed_groups(self):
+        existing = Group.objects.filter(slug__startswith=GROUP_PREFIX)
+        start = existing.count()
+        count = self.missing('groups', start)
+        self.insert(Group, (
+            Group(title=f'Сообщество {i}', slug=f'{GROUP_PREFIX}{i}',
+                  description=f'Синтетическое сообщество номер {i}')
+            for i in range(start, start + count)))
+        group_ids = list(existing.order_by('pk')
+                         .values_list('pk', flat=True))
+        self.report('Сообщества', count, len(group_ids))
+        return group_ids
+
+    def seed_images(self):
+        rng = self.rng('images', 0)
+        directory = os.path.join(settings.MEDIA_ROOT, IMAGE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for i in range(self.options['images']):
+            name = f'{IMAGE_DIR}/seed_{i}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                size = (rng.randint(400, 2000), rng.randint(300, 1500))
+                color = tuple(rng.randrange(256) for _ in range(3))
+                Image.new('RGB', size, color).save(path, 'JPEG')
+            names.append(name)
+        return names
+
+    def text(self, rng, low, high):
+        return ' '.join(rng.choice(WORDS)
+                        for _ in range(rng.randint(low, high))).capitalize()
+
+    def seed_posts(self, user_ids, group_ids, images):
+        start = Post.objects.filter(
+            author__username__startswith=USER_PREFIX).count()
+        count = self.missing('posts', start)
+        rng = self.rng('posts', start)
+        authors = PowerLaw(len(user_ids), self.options['alpha'], rng)
+        first = self.now - timedelta(days=self.options['days'])
+        step = timedelta(days=self.options['days']) / max(count, 1)
+
+        def rows():
+            for i in range(count):
+                image = None
+                if images and rng.random() < self.options['image_ratio']:
+                    image = rng.choice(images)
+                group_id = None
+                if group_ids and rng.random() < 0.7:
+                    group_id = rng.choice(group_ids)
+                yield Post(author_id=user_ids[authors.pick()],
+                           group_id=group_id, image=image,
+                           text=self.text(rng, 5, 80),
+                           pub_date=first + step * i)
+
+        if count and user_ids:
+            with explicit_dates(Post._meta.get_field('pub_date')):
+                self.insert(Post, rows())
+        post_ids = array('q', Post.objects.order_by('pk')
+                         .values_list('pk', flat=True))
+        self.report('Посты', count, len(post_ids))
+        return post_ids
+
+    def seed_comments(self, user_ids, post_ids):
+        start = Comment.objects.filter(
+            author__username__startswith=USER_PREFIX).count()
+        count = self.missing('comments', start)
+        rng = self.rng('comments', start)
+        if not (post_ids and user_ids):
+            return
+        # свежие и популярные посты комментируют чаще
+        posts = PowerLaw(len(post_ids), self.options['alpha'], rng)
+        minutes = max(self.options['days'] * 24 * 60, 1)
+
+        def rows():
+            for _ in range(count):
+                yield Comment(author_id=rng.choice(user_ids),
+                              post_id=post_ids[-1 - posts.pick()],
+                              text=self.text(rng, 2, 30),
+                              created=self.now - timedelta(
+                                  minutes=rng.randrange(minutes)))
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, rows())
+        self.report('Комментарии', count, start + count)
+
+    def seed_follows(self, user_ids):
+        existing = Follow.objects.filter(
+            user__username__startswith=USER_PREFIX)
+        start = existing.count()
+        count = self.missing('follows', start)
+        if len(user_ids) < 2:
+            return
+        rng = self.rng('follows', start)
+        authors = PowerLaw(len(user_ids), self.options['alpha'], rng)
+        limit = len(user_ids) * (len(user_ids) - 1)
+        target = min(start + count, limit)
+        total = start
+        # повторные пары отбрасывает уникальное ограничение в базе,
+        # поэтому набор уже созданных пар в памяти не нужен
+        while total < target:
+            batch = []
+            while len(batch) < min(self.batch_size, target - total):
+                user_id = rng.choice(user_ids)
+                author_id = user_ids[authors.pick()]
+                if user_id != author_id:
+                    batch.append(Follow(user_id=user_id,
+                                        author_id=author_id))
+            with transaction.atomic():
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+            total = existing.count()
+        self.report('Подписки', total - start, total)
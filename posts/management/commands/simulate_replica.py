@@ -0,0 +1,55 @@
+import sqlite3
+import time
+from collections import deque
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Изображает асинхронную реплику SQLite: раз в --interval '
+            'секунд снимает копию основной базы и через --lag секунд '
+            'записывает её в файл реплики')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=float, default=2)
+        parser.add_argument('--interval', type=float, default=1)
+        parser.add_argument('--once', action='store_true',
+                            help='скопировать базу сразу, без задержки, '
+                                 'и выйти')
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE or 'replica'
+        primary = connections['default'].settings_dict
+        replica = connections[alias].settings_dict
+        if not (primary['ENGINE'] == replica['ENGINE']
+                == 'django.db.backends.sqlite3'):
+            raise CommandError('Симулятор работает только с двумя '
+                               'файлами SQLite')
+
+        with closing(sqlite3.connect(primary['NAME'])) as source, \
+                closing(sqlite3.connect(replica['NAME'])) as target:
+            if options['once']:
+                source.backup(target)
+                self.stdout.write(f'Реплика {replica["NAME"]} обновлена')
+                return
+            self.replicate(source, target, options['lag'],
+                           options['interval'])
+
+    def replicate(self, source, target, lag, interval):
+        pending = deque()
+        self.stdout.write(f'Реплика отстаёт на {lag} с, Ctrl+C — выход')
+        try:
+            while True:
+                snapshot = sqlite3.connect(':memory:')
+                source.backup(snapshot)
+                pending.append((time.monotonic() + lag, snapshot))
+                while pending and pending[0][0] <= time.monotonic():
+                    _, snapshot = pending.popleft()
+                    snapshot.backup(target)
+                    snapshot.close()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
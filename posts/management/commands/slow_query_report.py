@@ -0,0 +1,94 @@
+import glob
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.slow_queries import fingerprint
+
+SORT_KEYS = {
+    'total': lambda group: group['total_ms'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max_ms'],
+}
+
+
+def log_files(path):
+    """Текущий журнал и его ротированные копии, от старых к новым."""
+    backups = sorted(glob.glob(f'{glob.escape(path)}.[0-9]*'),
+                     key=lambda name: int(name.rsplit('.', 1)[1]),
+                     reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def read_entries(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'sql' in entry:
+                    yield entry
+
+
+def summarize(entries):
+    groups = {}
+    for entry in entries:
+        key = fingerprint(entry['sql'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'fingerprint': key, 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'views': {}, 'locations': {}, 'plan': None,
+            }
+        duration = entry['duration_ms']
+        group['count'] += 1
+        group['total_ms'] += duration
+        if duration >= group['max_ms']:
+            group['max_ms'] = duration
+            group['plan'] = entry.get('plan')
+        for field in ('view', 'location'):
+            value = entry.get(field) or '-'
+            counter = group[f'{field}s']
+            counter[value] = counter.get(value, 0) + 1
+    return list(groups.values())
+
+
+def top(counter, limit=3):
+    ranked = sorted(counter.items(), key=lambda item: -item[1])[:limit]
+    return ', '.join(f'{name} ({count})' for name, count in ranked)
+
+
+class Command(BaseCommand):
+    help = ('Сводит журнал медленных запросов по отпечаткам: '
+            'число, суммарное и максимальное время, маршруты и план')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS),
+                            default='total')
+
+    def handle(self, *args, **options):
+        paths = log_files(options['log'])
+        if not paths:
+            raise CommandError(f'Журнал {options["log"]} не найден')
+        groups = summarize(read_entries(paths))
+        groups.sort(key=SORT_KEYS[options['sort']], reverse=True)
+        self.stdout.write(f'Медленных запросов: '
+                          f'{sum(group["count"] for group in groups)}, '
+                          f'разных: {len(groups)}')
+        for group in groups[:options['limit']]:
+            self.stdout.write('')
+            self.stdout.write(
+                f'{group["count"]} раз, всего {group["total_ms"]:.1f} мс, '
+                f'в среднем {group["total_ms"] / group["count"]:.1f} мс, '
+                f'максимум {group["max_ms"]:.1f} мс')
+            self.stdout.write(f'  {group["fingerprint"]}')
+            self.stdout.write(f'  маршруты: {top(group["views"])}')
+            self.stdout.write(f'  код: {top(group["locations"])}')
+            for line in group['plan'] or []:
+                self.stdout.write(f'  план: {line}')
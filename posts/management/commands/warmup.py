@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = ('Прогревает шаблоны, маршруты, миниатюры и кеш первых страниц '
+            'лент после деплоя')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int,
+                            default=settings.WARMUP_PAGES,
+                            help='сколько первых страниц главной рендерить')
+        parser.add_argument('--groups', type=int,
+                            default=settings.WARMUP_GROUPS,
+                            help='сколько самых больших сообществ')
+        parser.add_argument('--profiles', type=int,
+                            default=settings.WARMUP_PROFILES,
+                            help='сколько самых популярных авторов')
+        parser.add_argument('--budget', type=float,
+                            default=settings.WARMUP_BUDGET,
+                            help='сколько секунд отвести на прогрев')
+        parser.add_argument('--workers', type=int,
+                            default=settings.WARMUP_WORKERS)
+        parser.add_argument('--host', default=settings.ALLOWED_HOSTS[0],
+                            help='хост, под которым страницы попадут в кеш')
+
+    def handle(self, *args, **options):
+        report = warmup(pages=options['pages'], groups=options['groups'],
+                        profiles=options['profiles'],
+                        budget=options['budget'],
+                        workers=options['workers'], host=options['host'])
+        for error in report['template_errors']:
+            self.stderr.write(error)
+        self.stdout.write(f'Шаблонов: {report["templates"]}, '
+                          f'маршрутов: {report["routes"]}, '
+                          f'миниатюр в очереди: {report["thumbnails"]}')
+        skipped = 0
+        for url, status in report['pages'].items():
+            if status is None:
+                skipped += 1
+                continue
+            self.stdout.write(f'{status} {url}')
+        self.stdout.write(f'Прогрето за {report["seconds"]} с, '
+                          f'не успели: {skipped}')
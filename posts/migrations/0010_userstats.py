@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 16:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def counts(queryset, field, user_ids):
+    rows = (queryset.filter(**{f'{field}__in': user_ids})
+            .values(field).annotate(total=models.Count('pk')))
+    return {row[field]: row['total'] for row in rows}
+
+
+def fill_stats(apps, schema_editor):
+    """Посчитать счётчики всех пользователей пачками по исходным таблицам.
+
+    Таблица только что создана, поэтому строки лишь вставляются.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_id).order_by('pk')
+                        .values_list('pk', flat=True)[:BATCH_SIZE])
+        if not user_ids:
+            return
+        posts = counts(Post.objects, 'author_id', user_ids)
+        followers = counts(Follow.objects, 'author_id', user_ids)
+        following = counts(Follow.objects, 'user_id', user_ids)
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id,
+                       posts_count=posts.get(user_id, 0),
+                       followers_count=followers.get(user_id, 0),
+                       following_count=following.get(user_id, 0))
+             for user_id in user_ids])
+        last_id = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0009_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:23
+
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def counts(queryset, field, user_ids):
+    rows = (queryset.filter(**{f'{field}__in': user_ids})
+            .values(field).annotate(total=models.Count('pk')))
+    return {row[field]: row['total'] for row in rows}
+
+
+def recount(apps, user_ids):
+    """Пересчитать счётчики пачки пользователей по исходным таблицам."""
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    posts = counts(Post.objects, 'author_id', user_ids)
+    followers = counts(Follow.objects, 'author_id', user_ids)
+    following = counts(Follow.objects, 'user_id', user_ids)
+    existing = set(UserStats.objects.filter(user_id__in=user_ids)
+                   .values_list('user_id', flat=True))
+    rows = [UserStats(user_id=user_id,
+                      posts_count=posts.get(user_id, 0),
+                      followers_count=followers.get(user_id, 0),
+                      following_count=following.get(user_id, 0))
+            for user_id in user_ids]
+    UserStats.objects.bulk_update(
+        [row for row in rows if row.user_id in existing],
+        ['posts_count', 'followers_count', 'following_count'])
+    UserStats.objects.bulk_create(
+        [row for row in rows if row.user_id not in existing])
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставить по одной подписке на пару, удаляя дубли пачками."""
+    Follow = apps.get_model('posts', 'Follow')
+    touched = set()
+    while True:
+        pairs = list(Follow.objects.values('user_id', 'author_id')
+                     .annotate(total=models.Count('id'),
+                               keep=models.Min('id'))
+                     .filter(total__gt=1)
+                     .order_by('user_id', 'author_id')[:BATCH_SIZE])
+        if not pairs:
+            break
+        same_pair = reduce(or_, (models.Q(user_id=pair['user_id'],
+                                          author_id=pair['author_id'])
+                                 for pair in pairs))
+        (Follow.objects.filter(same_pair)
+         .exclude(id__in=[pair['keep'] for pair in pairs]).delete())
+        for pair in pairs:
+            touched.update((pair['user_id'], pair['author_id']))
+
+    # счётчики подписок учитывали дубли
+    touched = sorted(touched)
+    for start in range(0, len(touched), BATCH_SIZE):
+        recount(apps, touched[start:start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_task'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_user_author_uniq'),
+        ),
+    ]
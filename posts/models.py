@@ -1,8 +1,16 @@
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.utils import timezone
 
 User = get_user_model()
 
+# подписки на нескольких авторов, оформленные FollowQuerySet.follow_many
+follows_created = Signal(providing_args=['user_id', 'author_ids', 'using'])
+
 
 class Group(models.Model):
 
@@ -14,6 +22,26 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты ленты с авторами, сообществами и числом комментариев.
+
+        Комментарии считаются коррелированным подзапросом, а не JOIN с
+        GROUP BY: так лента идёт по индексу (pub_date, id) под LIMIT и
+        считает комментарии только у попавших на страницу постов.
+        """
+        comments = (Comment.objects.filter(post=models.OuterRef('pk'))
+                    .order_by().values('post')
+                    .annotate(total=models.Count('pk')).values('total'))
+        return (self.select_related('author', 'group')
+                .annotate(comments_count=Coalesce(
+                    models.Subquery(comments,
+                                    output_field=models.IntegerField()),
+                    0))
+                .order_by('-pub_date', '-id'))
+
+
 class Post(models.Model):
 
     text = models.TextField()
@@ -29,13 +57,32 @@ class Post(models.Model):
                               blank=True
                               )
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    thumbnail_width = models.PositiveSmallIntegerField(null=True,
+                                                       editable=False)
+    thumbnail_height = models.PositiveSmallIntegerField(null=True,
+                                                        editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.author} - {self.pub_date} - {self.group} - {self.image}'
 
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(self.thumbnail) if self.thumbnail else ''
+
     class Meta:
 
-        ordering = ["-pub_date", ]
+        ordering = ["-pub_date", "-id", ]
+        indexes = [
+            models.Index(fields=["pub_date", "id"],
+                         name="post_pub_date_id_idx"),
+            models.Index(fields=["author", "pub_date"],
+                         name="post_author_pub_date_idx"),
+            models.Index(fields=["group", "pub_date"],
+                         name="post_group_pub_date_idx"),
+        ]
 
 
 class Comment(models.Model):
@@ -53,7 +100,84 @@ class Comment(models.Model):
 
     class Meta:
 
-        ordering = ["-created", ]
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=["post", "created"],
+                         name="comment_post_created_idx"),
+        ]
+
+
+class FollowQuerySet(models.QuerySet):
+    """Идемпотентные подписки одним запросом к базе.
+
+    Вместо ``save()``/``delete()`` выполняется один INSERT с пропуском
+    конфликта или один DELETE, поэтому двойной клик не создаёт дублей и
+    не падает на уникальности. Сигналы ``post_save``/``post_delete``
+    отправляются вручную и только если строка действительно появилась
+    или исчезла — на них держатся счётчики и отметки лент.
+    """
+
+    def _execute(self, sql, params):
+        """Выполнить ``sql`` в базе для записи, вернуть число строк."""
+        db = self._db or router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return db, cursor.rowcount
+
+    def _sql(self, template):
+        ops = connections[self._db or router.db_for_write(self.model)].ops
+        return template.format(
+            insert=ops.insert_statement(ignore_conflicts=True),
+            table=ops.quote_name(self.model._meta.db_table),
+            user=ops.quote_name('user_id'),
+            author=ops.quote_name('author_id'),
+            ignore=ops.ignore_conflicts_suffix_sql(ignore_conflicts=True))
+
+    def follow(self, user, author):
+        """Подписать ``user`` на ``author``; True, если подписка новая."""
+        db, inserted = self._execute(self._sql(
+            '{insert} {table} ({user}, {author}) VALUES (%s, %s) {ignore}'),
+            [user.pk, author.pk])
+        if inserted != 1:
+            return False
+        post_save.send(sender=self.model,
+                       instance=self.model(user=user, author=author),
+                       created=True, update_fields=None, raw=False,
+                       using=db)
+        return True
+
+    def unfollow(self, user, author):
+        """Отписать ``user`` от ``author``; True, если подписка была."""
+        db, deleted = self._execute(self._sql(
+            'DELETE FROM {table} WHERE {user} = %s AND {author} = %s'),
+            [user.pk, author.pk])
+        if not deleted:
+            return False
+        post_delete.send(sender=self.model,
+                         instance=self.model(user=user, author=author),
+                         using=db)
+        return True
+
+    def follow_many(self, user, author_ids):
+        """Подписать ``user`` на авторов ``author_ids`` одним INSERT.
+
+        Вместо ``post_save`` на каждую подписку отправляется один сигнал
+        ``follows_created`` со списком новых авторов; его же и вернуть.
+        """
+        db = self._db or router.db_for_write(self.model)
+        author_ids = set(author_ids) - {user.pk}
+        followed = set(self.using(db)
+                       .filter(user=user, author_id__in=author_ids)
+                       .values_list('author_id', flat=True))
+        new_ids = sorted(author_ids - followed)
+        if not new_ids:
+            return []
+        self.using(db).bulk_create(
+            [self.model(user=user, author_id=author_id)
+             for author_id in new_ids], ignore_conflicts=True)
+        follows_created.send(sender=self.model, user_id=user.pk,
+                             author_ids=new_ids, using=db)
+        return new_ids
 
 
 class Follow(models.Model):
@@ -65,5 +189,143 @@ class Follow(models.Model):
                                related_name='following',
                                on_delete=models.CASCADE)
 
+    objects = FollowQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.user} follower of {self.author}'
+
+    class Meta:
+
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"],
+                                    name="follow_user_author_uniq"),
+        ]
+
+
+class TimelineEntry(models.Model):
+
+    user = models.ForeignKey(User,
+                             related_name='timeline',
+                             on_delete=models.CASCADE)
+    post = models.ForeignKey(Post,
+                             related_name='timeline_entries',
+                             on_delete=models.CASCADE)
+    pub_date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.post} in timeline of {self.user}'
+
+    class Meta:
+
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_user_pub_post_idx"),
+        ]
+
+
+class UserStats(models.Model):
+
+    user = models.OneToOneField(User,
+                                related_name='stats',
+                                on_delete=models.CASCADE,
+                                primary_key=True)
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user} stats'
+
+    @classmethod
+    def of(cls, user):
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    @classmethod
+    def change(cls, user_id, **deltas):
+        """Атомарно изменить счётчики пользователя через F()-выражения.
+
+        Уменьшение не опускает счётчик ниже нуля: после bulk_create или
+        ручных правок он мог разойтись с таблицей, и удаление упало бы на
+        CHECK-ограничении. Точные значения вернёт ``recount_user_stats``.
+        """
+        updates = cls._updates(deltas)
+        if cls.objects.filter(user_id=user_id).update(**updates):
+            return
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        _, created = cls.objects.get_or_create(user_id=user_id,
+                                               defaults=deltas)
+        if not created:
+            cls.objects.filter(user_id=user_id).update(**updates)
+
+    @classmethod
+    def change_many(cls, user_ids, **deltas):
+        """Изменить счётчики нескольких пользователей одним UPDATE.
+
+        Недостающие строки создаются одним INSERT; строку, созданную
+        параллельно, INSERT пропустит — её поправит ``recount_user_stats``.
+        """
+        existing = set(cls.objects.filter(user_id__in=user_ids)
+                       .values_list('user_id', flat=True))
+        if existing:
+            cls.objects.filter(user_id__in=existing).update(
+                **cls._updates(deltas))
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, **deltas)
+             for user_id in user_ids if user_id not in existing],
+            ignore_conflicts=True)
+
+    @staticmethod
+    def _updates(deltas):
+        return {field: models.F(field) + delta if delta >= 0
+                else Greatest(models.F(field) + delta, 0)
+                for field, delta in deltas.items()}
+
+
+class Task(models.Model):
+    """Задача фоновой очереди, см. posts/tasks.py."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (FAILED, 'не удалась'),
+    )
+
+    name = models.CharField(max_length=200)
+    payload = models.TextField(default='{}')
+    priority = models.SmallIntegerField(default=0)
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    visibility_timeout = models.PositiveIntegerField(default=300)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+    class Meta:
+
+        ordering = ["-priority", "available_at", "id"]
+        indexes = [
+            models.Index(fields=["status", "-priority", "available_at"],
+                         name="task_ready_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["dedup_key"],
+                                    condition=models.Q(status='queued'),
+                                    name="task_queued_dedup_key"),
+        ]
@@ -0,0 +1,92 @@
+"""Кеш готовых страниц для анонимных читателей.
+
+``PageCacheMiddleware`` отдаёт из кеша целые ответы маршрутов из
+``PAGE_CACHE_VIEWS``, если у запроса нет cookie сессии и CSRF: такой
+посетитель точно анонимен, и страница у всех одинакова. Ключ — хост,
+путь с параметрами и язык.
+
+Вместе с ответом хранятся отметки изменения его лент из ``feed_cache``
+(view кладёт их в ``request.feed_scopes``). Запись в пост, комментарий,
+сообщество или подписку обновляет отметку, и сохранённая страница
+перестаёт совпадать — отдельно удалять её не нужно. Страницы без своих
+лент, например flatpages, привязаны к отметке ``pages``. Все страницы
+ещё зависят от отметки ``site``, которую обновляют миграции и очистка
+базы (flush): после них прежние id сообществ и авторов ничего не значат.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from yatube.metrics import registry, view_label
+
+from . import feed_cache
+
+DEFAULT_SCOPES = ('pages',)
+SITE_SCOPE = 'site'
+SAFE_METHODS = ('GET', 'HEAD')
+HEADER = 'X-Page-Cache'
+
+
+def cache_key(request):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'page:{translation.get_language()}:{digest}'
+
+
+def is_cacheable(response):
+    cache_control = response.get('Cache-Control', '')
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in cache_control
+            and 'no-store' not in cache_control)
+
+
+class PageCacheMiddleware:
+    """Должен стоять после AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._page_cache_key = None
+        response = self.get_response(request)
+        key = request._page_cache_key
+        if key is not None and is_cacheable(response):
+            scopes = (SITE_SCOPE,) + tuple(
+                getattr(request, 'feed_scopes', DEFAULT_SCOPES))
+            cache.set(key, (scopes, feed_cache.markers(*scopes), response),
+                      settings.PAGE_CACHE_TIMEOUT)
+            response[HEADER] = 'miss'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = view_label(request)
+        if (request.method not in SAFE_METHODS
+                or request.resolver_match.view_name
+                not in settings.PAGE_CACHE_VIEWS):
+            return None
+        if (settings.SESSION_COOKIE_NAME in request.COOKIES
+                or settings.CSRF_COOKIE_NAME in request.COOKIES):
+            registry.count_page_cache(view, 'bypass')
+            return None
+
+        key = cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            scopes, marks, response = entry
+            if feed_cache.markers(*scopes) == marks:
+                registry.count_page_cache(view, 'hit')
+                response[HEADER] = 'hit'
+                return get_conditional_response(
+                    request, etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response)
+        registry.count_page_cache(view, 'miss')
+        request._page_cache_key = key
+        return None
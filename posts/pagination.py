@@ -0,0 +1,286 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
+
+from .feed_cache import version
+from django.utils.dateparse import parse_datetime
+
+PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COUNT_LIMIT = 10000
+PAGE_WINDOW = 2
+NUMBERED_PAGES = 5
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_token(value):
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def encode_cursor(obj, date_field='pub_date', id_field='pk'):
+    date = getattr(obj, date_field).isoformat()
+    return encode_token(f'{date},{getattr(obj, id_field)}')
+
+
+def decode_cursor(token, parse=parse_datetime):
+    """Вернуть пару (ключ, id) из токена или None, если токен испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        key, pk = raw.rsplit(',', 1)
+        key = parse(key)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if key is None or not -MAX_ID <= pk <= MAX_ID:
+        return None
+    return key, pk
+
+
+def estimate_count(queryset):
+    """Быстро оценить размер таблицы без COUNT(*) по разбросу ключей.
+
+    Удалённые строки делают оценку немного завышенной.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    column = connection.ops.quote_name(model._meta.pk.column)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min({column}), max({column}) FROM {table}')
+        low, high = cursor.fetchone()
+    if low is None:
+        return 0
+    return high - low + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает строки огромных таблиц точно.
+
+    Без фильтров берётся оценка размера таблицы, с фильтрами — точный
+    COUNT, но не дальше ``COUNT_LIMIT`` строк.
+    """
+
+    count_limit = COUNT_LIMIT
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimate_count(queryset)
+        return queryset[:self.count_limit].count()
+
+
+def feed_count_limit(per_page):
+    return NUMBERED_PAGES * per_page + 1
+
+
+def _feed_count(object_list, per_page, approximate):
+    if approximate:
+        estimate = estimate_count(object_list)
+        if estimate > settings.FEED_APPROXIMATE_COUNT_AFTER:
+            return estimate
+    limit = feed_count_limit(per_page)
+    return object_list.values('pk')[:limit].count()
+
+
+def feed_count(object_list, per_page, scope=None, approximate=False):
+    """Число записей ленты для нумерованных страниц.
+
+    Номера есть только у первых ``NUMBERED_PAGES`` страниц, дальше лента
+    листается курсорами, поэтому считать все записи не нужно: COUNT идёт
+    по подзапросу с LIMIT, на одну запись больше нумерованных страниц, —
+    этого хватает, чтобы понять, есть ли что-то дальше. Число хранится
+    под версией ленты ``scope`` из ``feed_cache`` и сбрасывается теми же
+    сигналами, что и фрагменты страниц. Для ленты по всей таблице можно
+    включить ``approximate``: если в таблице больше
+    ``FEED_APPROXIMATE_COUNT_AFTER`` строк, вместо COUNT берётся оценка
+    её размера.
+    """
+    def count():
+        return _feed_count(object_list, per_page, approximate)
+
+    if scope is None:
+        return count()
+    return cache.get_or_set(f'feed_count:{scope}:{version(scope)}', count,
+                            None)
+
+
+def page_window(paginator, number, window=PAGE_WINDOW):
+    """Номера страниц вокруг текущей; None означает многоточие.
+
+    Многоточие в конце — записи за последней нумерованной страницей,
+    до них ведёт ссылка-курсор «Следующая».
+    """
+    last = min(paginator.num_pages, NUMBERED_PAGES)
+    numbers = {1, last}
+    numbers.update(range(max(number - window, 1),
+                         min(number + window, last) + 1))
+    links = []
+    previous = 0
+    for i in sorted(numbers):
+        if i - previous > 1:
+            links.append(None)
+        links.append(i)
+        previous = i
+    if paginator.count >= feed_count_limit(paginator.per_page):
+        links.append(None)
+    return links
+
+
+class CursorPage:
+    """Страница ленты, построенная без COUNT(*) и OFFSET."""
+
+    number = None
+
+    def __init__(self, object_list, paginator, cursor,
+                 has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor
+        self._has_previous = has_previous
+        self._has_next = has_next
+        # курсоры считаются сразу: object_list потом можно заменить
+        # объектами, на которые ссылаются записи страницы
+        self.next_cursor = self.previous_cursor = ''
+        if object_list and has_next:
+            self.next_cursor = paginator.cursor(object_list[-1])
+        if object_list and has_previous:
+            self.previous_cursor = paginator.cursor(object_list[0])
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (дата, id) в порядке убывания.
+
+    Токен ``after`` выдаёт записи старше указанной, ``before`` — новее.
+    Новые записи, появившиеся между запросами, не сдвигают страницы.
+    ``id_field`` — второе поле ключа, если это не первичный ключ.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 id_field='pk'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.date_field = date_field
+        self.id_field = id_field
+
+    def cursor(self, obj):
+        return encode_cursor(obj, self.date_field, self.id_field)
+
+    def _older(self, date, pk):
+        field = self.date_field
+        return (Q(**{f'{field}__lt': date})
+                | Q(**{field: date, f'{self.id_field}__lt': pk}))
+
+    def _newer(self, date, pk):
+        field = self.date_field
+        return (Q(**{f'{field}__gt': date})
+                | Q(**{field: date, f'{self.id_field}__gt': pk}))
+
+    def get_page(self, after=None, before=None):
+        field = self.date_field
+        queryset = self.object_list
+        limit = self.per_page + 1
+
+        key = decode_cursor(before) if before else None
+        if key is not None:
+            rows = list(queryset.filter(self._newer(*key))
+                        .order_by(field, self.id_field)[:limit])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(rows, self, f'b{before}',
+                              has_previous=has_previous, has_next=True)
+
+        key = decode_cursor(after) if after else None
+        if key is not None:
+            queryset = queryset.filter(self._older(*key))
+        rows = list(queryset.order_by(f'-{field}', f'-{self.id_field}')
+                    [:limit])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self,
+                          f'a{after}' if key else '',
+                          has_previous=key is not None, has_next=has_next)
+
+
+def page_number(request):
+    """Номер страницы из ``?page=``, не дальше нумерованных страниц."""
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        return 1
+    return min(max(number, 1), NUMBERED_PAGES)
+
+
+def far_page_redirect(request):
+    """Редирект со старой ссылки ``?page=`` за нумерованными страницами.
+
+    Дальше ``NUMBERED_PAGES`` лента листается курсором, поэтому такие
+    ссылки ведут на последнюю нумерованную страницу, а не в OFFSET по
+    хвосту ленты. Вернуть ответ-редирект или None.
+    """
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+    if number <= NUMBERED_PAGES:
+        return None
+    query = request.GET.copy()
+    query['page'] = NUMBERED_PAGES
+    return HttpResponseRedirect(f'{request.path}?{query.urlencode()}')
+
+
+def paginate(request, object_list, per_page=PER_PAGE, scope=None,
+             approximate=False, id_field='pk', load=None):
+    """Разбить ленту на страницы.
+
+    При наличии ``?after=`` или ``?before=`` используется keyset-пагинация,
+    иначе — первые ``NUMBERED_PAGES`` страниц по номерам. ``scope`` — имя
+    ленты в ``feed_cache``, под которым кешируется число записей,
+    ``approximate`` включает оценку числа записей в больших таблицах.
+    ``load`` превращает записи страницы в показываемые объекты: так ленту
+    листают по узкой таблице, а посты грузят только для одной страницы.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        paginator = CursorPaginator(object_list, per_page, id_field=id_field)
+        page = paginator.get_page(after=after, before=before)
+    else:
+        # обычный Paginator, число записей — ограниченное и кешированное
+        paginator = Paginator(object_list, per_page)
+        paginator.count = feed_count(object_list, per_page, scope=scope,
+                                     approximate=approximate)
+        page = paginator.get_page(page_number(request))
+    if load is not None:
+        page.object_list = load(page.object_list)
+    return {'page': page, 'paginator': paginator}
@@ -0,0 +1,117 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .pagination import decode_cursor, encode_token
+
+FTS_TABLE = 'posts_post_fts'
+TERM_RE = re.compile(r'\w+')
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def match_expression(query):
+    """Превратить пользовательский ввод в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки, последнее ищется как префикс.
+    """
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def matching_ids(query):
+    """Подзапрос с id постов, подходящих под запрос (для admin и ORM)."""
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} '
+                  f'WHERE {FTS_TABLE} MATCH %s',
+                  [match_expression(query)])
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet)
+                     .replace(MARK_START, '<mark>')
+                     .replace(MARK_END, '</mark>'))
+
+
+def encode_search_cursor(rank, pk):
+    return encode_token(f'{rank!r},{pk}')
+
+
+def decode_search_cursor(token):
+    return decode_cursor(token, float)
+
+
+class SearchPage:
+
+    def __init__(self, object_list, has_next, next_cursor, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self.next_cursor = next_cursor
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+def search(query, group=None, author=None, after=None, per_page=10):
+    """Найти посты по тексту, лучшие по BM25 — первыми.
+
+    Курсор ``after`` — пара (rank, id) последнего результата страницы.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return SearchPage([], False, '', False)
+
+    conditions = [f'{FTS_TABLE} MATCH %s']
+    params = [expression]
+    if group is not None:
+        conditions.append('p.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        conditions.append('p.author_id = %s')
+        params.append(author.pk)
+    cursor_key = decode_search_cursor(after) if after else None
+    if cursor_key is not None:
+        conditions.append(f'(bm25({FTS_TABLE}), p.id) > (%s, %s)')
+        params.extend(cursor_key)
+
+    sql = (f'SELECT p.id, bm25({FTS_TABLE}), '
+           f"snippet({FTS_TABLE}, 0, %s, %s, '…', 16) "
+           f'FROM {FTS_TABLE} JOIN posts_post p ON p.id = {FTS_TABLE}.rowid '
+           f'WHERE {" AND ".join(conditions)} '
+           f'ORDER BY bm25({FTS_TABLE}), p.id LIMIT %s')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END, *params, per_page + 1])
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+    results = []
+    for pk, rank, snippet in rows:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.rank = rank
+        post.snippet = highlight(snippet)
+        results.append(post)
+    next_cursor = ''
+    if has_next:
+        last_id, last_rank, _ = rows[-1]
+        next_cursor = encode_search_cursor(last_rank, last_id)
+    return SearchPage(results, has_next, next_cursor, cursor_key is not None)
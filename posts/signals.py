@@ -0,0 +1,122 @@
+from django.contrib.flatpages.models import FlatPage
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from yatube import slow_queries, sqlite
+
+from .models import Comment, Follow, Group, Post, UserStats, follows_created
+from . import feed_cache, timeline
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, raw=False, **kwargs):
+    instance._old_group_id = None
+    if instance.pk and not raw:
+        instance._old_group_id = (Post.objects.filter(pk=instance.pk)
+                                  .values_list('group_id', flat=True)
+                                  .first())
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = feed_cache.post_scopes(instance.author_id, instance.group_id)
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id not in (None, instance.group_id):
+        scopes.append(f'group:{old_group_id}')
+    feed_cache.bump(*scopes)
+    if created:
+        UserStats.change(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    else:
+        feed_cache.bump_author_followers_later(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.change(instance.author_id, posts_count=-1)
+    feed_cache.bump(*feed_cache.post_scopes(instance.author_id,
+                                            instance.group_id))
+    feed_cache.bump_author_followers_later(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.change(instance.user_id, following_count=1)
+        UserStats.change(instance.author_id, followers_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.touch(f'author:{instance.user_id}',
+                         f'author:{instance.author_id}')
+
+
+@receiver(follows_created, sender=Follow)
+def follows_created_in_bulk(sender, user_id, author_ids, **kwargs):
+    UserStats.change(user_id, following_count=len(author_ids))
+    UserStats.change_many(author_ids, followers_count=1)
+    timeline.backfill_many(user_id, author_ids)
+    feed_cache.touch(f'author:{user_id}',
+                     *(f'author:{author_id}' for author_id in author_ids))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.change(instance.user_id, following_count=-1)
+    UserStats.change(instance.author_id, followers_count=-1)
+    timeline.remove(instance.user_id, instance.author_id)
+    feed_cache.touch(f'author:{instance.user_id}',
+                     f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    post = (Post.objects.filter(pk=instance.post_id)
+            .values_list('author_id', 'group_id').first())
+    if post is None:
+        return
+    feed_cache.bump(*feed_cache.post_scopes(*post))
+    feed_cache.bump_author_followers_later(post[0])
+
+
+def _group_changed(group):
+    author_ids = list(group.posts_group.order_by()
+                      .values_list('author_id', flat=True).distinct())
+    feed_cache.bump('index', f'group:{group.pk}',
+                    *[f'author:{author_id}' for author_id in author_ids])
+    for author_id in author_ids:
+        feed_cache.bump_author_followers_later(author_id)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _group_changed(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    _group_changed(instance)
+
+
+@receiver(post_save, sender=FlatPage)
+@receiver(post_delete, sender=FlatPage)
+def flatpage_changed(sender, instance, **kwargs):
+    feed_cache.touch('pages')
+
+
+@receiver(post_migrate)
+def database_reset(sender, **kwargs):
+    if sender.name == 'posts':
+        feed_cache.touch('site')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    sqlite.apply_pragmas(connection)
+    slow_queries.install(connection)
@@ -0,0 +1,42 @@
+from django.db.models import Count
+
+
+def _counts(queryset, field, user_ids):
+    rows = (queryset.filter(**{f'{field}__in': user_ids})
+            .values(field).annotate(total=Count('pk')))
+    return {row[field]: row['total'] for row in rows}
+
+
+def recount_batch(user_ids, post_model, follow_model, stats_model):
+    """Пересчитать счётчики пачки пользователей по исходным таблицам."""
+    posts = _counts(post_model.objects, 'author_id', user_ids)
+    followers = _counts(follow_model.objects, 'author_id', user_ids)
+    following = _counts(follow_model.objects, 'user_id', user_ids)
+    existing = set(stats_model.objects.filter(user_id__in=user_ids)
+                   .values_list('user_id', flat=True))
+    rows = [stats_model(user_id=user_id,
+                        posts_count=posts.get(user_id, 0),
+                        followers_count=followers.get(user_id, 0),
+                        following_count=following.get(user_id, 0))
+            for user_id in user_ids]
+    stats_model.objects.bulk_update(
+        [row for row in rows if row.user_id in existing],
+        ['posts_count', 'followers_count', 'following_count'])
+    stats_model.objects.bulk_create(
+        [row for row in rows if row.user_id not in existing])
+    return len(rows)
+
+
+def recount_all(user_model, post_model, follow_model, stats_model,
+                batch_size=500):
+    last_id = 0
+    total = 0
+    while True:
+        user_ids = list(user_model.objects.filter(pk__gt=last_id)
+                        .order_by('pk')
+                        .values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            return total
+        total += recount_batch(user_ids, post_model, follow_model,
+                               stats_model)
+        last_id = user_ids[-1]
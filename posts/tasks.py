@@ -0,0 +1,192 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+Задача — функция, помеченная ``@task``. Её ставят в очередь после
+коммита текущей транзакции::
+
+    @task(priority=5, max_attempts=3)
+    def send_message(subject, body, to):
+        ...
+
+    send_message.delay('Тема', 'Текст', ['user@example.com'],
+                       dedup_key='reset:42')
+
+Аргументы хранятся в JSON, поэтому передавайте id, а не объекты.
+Задача с ``dedup_key`` не ставится, пока в очереди ждёт другая с тем же
+ключом. Задачи выполняют воркеры ``manage.py run_workers``: воркер
+забирает задачу условным UPDATE и держит её ``visibility_timeout``
+секунд; если он упал, по истечении срока задачу заберёт другой.
+Упавшая задача повторяется с экспоненциальной задержкой, после
+``max_attempts`` попыток остаётся в таблице со статусом ``failed``.
+Выполненные задачи удаляются.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 10
+
+
+class TaskDefinition:
+
+    def __init__(self, func, priority=0, max_attempts=None,
+                 visibility_timeout=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.priority = priority
+        self.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        self.visibility_timeout = (visibility_timeout
+                                   or settings.TASK_VISIBILITY_TIMEOUT)
+        self.__doc__ = func.__doc__
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, dedup_key=None, priority=None, countdown=0,
+                **kwargs):
+        """Сразу записать задачу в очередь; вернуть её или ждущий дубль."""
+        task = Task(name=self.name,
+                    payload=json.dumps({'args': args, 'kwargs': kwargs}),
+                    priority=self.priority if priority is None else priority,
+                    dedup_key=dedup_key,
+                    max_attempts=self.max_attempts,
+                    visibility_timeout=self.visibility_timeout,
+                    available_at=timezone.now()
+                    + timedelta(seconds=countdown))
+        if dedup_key is None:
+            task.save()
+            return task
+        try:
+            with transaction.atomic():
+                task.save()
+        except IntegrityError:
+            return Task.objects.filter(dedup_key=dedup_key,
+                                       status=Task.QUEUED).first()
+        return task
+
+    def delay(self, *args, **kwargs):
+        """Поставить задачу в очередь после коммита текущей транзакции.
+
+        При ``TASKS_EAGER`` задача выполняется сразу в этом процессе —
+        для разработки без воркеров.
+        """
+        if settings.TASKS_EAGER:
+            kwargs = {key: value for key, value in kwargs.items()
+                      if key not in ('dedup_key', 'priority', 'countdown')}
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+        else:
+            transaction.on_commit(lambda: self.enqueue(*args, **kwargs))
+
+
+def task(func=None, **options):
+    """Декоратор задачи: ``@task`` или ``@task(priority=..., ...)``."""
+    if func is None:
+        return lambda func: TaskDefinition(func, **options)
+    return TaskDefinition(func, **options)
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой: 2ⁿ с потолком и разбросом."""
+    delay = min(settings.TASK_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.TASK_RETRY_MAX_DELAY)
+    return delay + random.uniform(0, delay / 10)
+
+
+class Worker:
+    """Забирает и выполняет задачи по одной."""
+
+    def __init__(self, name=None):
+        self.name = name or (f'{socket.gethostname()}:{os.getpid()}:'
+                             f'{threading.get_ident()}')
+
+    def claim(self):
+        now = timezone.now()
+        candidates = (Task.objects
+                      .filter(status__in=(Task.QUEUED, Task.RUNNING),
+                              available_at__lte=now)
+                      .order_by('-priority', 'available_at', 'id')
+                      .values_list('pk', 'status', 'attempts',
+                                   'max_attempts', 'visibility_timeout')
+                      [:CLAIM_BATCH])
+        for pk, status, attempts, max_attempts, timeout in candidates:
+            current = Task.objects.filter(pk=pk, status=status,
+                                          attempts=attempts)
+            if status == Task.RUNNING and attempts >= max_attempts:
+                # воркер пропал на последней попытке
+                current.update(status=Task.FAILED, locked_by='',
+                               last_error='visibility timeout expired')
+                continue
+            claimed = current.update(
+                status=Task.RUNNING, attempts=F('attempts') + 1,
+                locked_by=self.name,
+                available_at=now + timedelta(seconds=timeout))
+            if claimed:
+                return Task.objects.get(pk=pk)
+        return None
+
+    def execute(self, task):
+        mine = Task.objects.filter(pk=task.pk, locked_by=self.name,
+                                   attempts=task.attempts)
+        try:
+            payload = json.loads(task.payload)
+            import_string(task.name)(*payload['args'], **payload['kwargs'])
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('task %s #%s failed, attempt %s',
+                           task.name, task.pk, task.attempts, exc_info=True)
+            if task.attempts >= task.max_attempts:
+                mine.update(status=Task.FAILED, locked_by='',
+                            last_error=error)
+                return False
+            retry_at = timezone.now() + timedelta(
+                seconds=backoff(task.attempts))
+            try:
+                with transaction.atomic():
+                    mine.update(status=Task.QUEUED, locked_by='',
+                                available_at=retry_at, last_error=error)
+            except IntegrityError:
+                # пока задача выполнялась, в очередь встал её дубль
+                mine.delete()
+            return False
+        mine.delete()
+        return True
+
+    def run_once(self):
+        """Выполнить одну задачу; False, если очередь пуста."""
+        close_old_connections()
+        task = self.claim()
+        if task is None:
+            return False
+        try:
+            self.execute(task)
+        finally:
+            close_old_connections()
+        return True
+
+    def run(self, stop, burst=False, poll_interval=None):
+        """Работать до ``stop``, а с ``burst`` — пока есть задачи."""
+        poll_interval = poll_interval or settings.TASK_POLL_INTERVAL
+        while not stop.is_set():
+            if self.run_once():
+                continue
+            if burst:
+                break
+            stop.wait(poll_interval)
+
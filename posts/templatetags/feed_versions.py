@@ -0,0 +1,12 @@
+from django import template
+
+from posts.feed_cache import version
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_version(scope, pk=None):
+    if pk is not None:
+        scope = f'{scope}:{pk}'
+    return version(scope)
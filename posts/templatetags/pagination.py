@@ -0,0 +1,17 @@
+from django import template
+
+from posts import pagination
+
+register = template.Library()
+
+
+@register.filter
+def after_cursor(page):
+    if not len(page):
+        return ''
+    return pagination.encode_cursor(page[len(page) - 1])
+
+
+@register.filter
+def page_window(page):
+    return pagination.page_window(page.paginator, page.number)
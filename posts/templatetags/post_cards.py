@@ -0,0 +1,17 @@
+from django import template
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, timeout, *key_parts):
+    """``{% post_cards page 14400 "index_page" version page.cursor %}``"""
+    return cards.render(posts, context.get('user'), *key_parts,
+                        timeout=timeout)
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return cards.render([post], context.get('user'))
@@ -0,0 +1,53 @@
+# posts/tests/test_admin.py
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.pagination import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pw')
+        group = Group.objects.create(title='admin group', slug='admin-group')
+        for i in range(20):
+            author = User.objects.create_user(username=f'author{i}')
+            post = Post.objects.create(author=author, group=group,
+                                       text=f'admin post {i}')
+            Comment.objects.create(author=cls.admin, post=post, text='c')
+            Follow.objects.create(user=cls.admin, author=author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_changelist_query_budget(self):
+        # сессия, пользователь, оценка размера таблицы и сама страница
+        for model, budget in (('post', 4), ('comment', 4), ('follow', 4)):
+            url = reverse(f'admin:posts_{model}_changelist')
+            with self.subTest(model=model), self.assertNumQueries(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_search(self):
+        url = reverse('admin:posts_post_changelist')
+        response = self.client.get(url, {'q': 'post 7'})
+        self.assertContains(response, 'admin post 7')
+        response = self.client.get(url, {'q': '!!!'})
+        self.assertEqual(response.status_code, 200,
+                         "Поиск из одних знаков препинания упал")
+        self.assertNotContains(response, 'admin post')
+
+    def test_estimated_count(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertGreaterEqual(paginator.count, 20)
+        filtered = EstimatedCountPaginator(
+            Post.objects.filter(text__startswith='admin'), 10)
+        filtered.count_limit = 5
+        self.assertEqual(filtered.count, 5)
@@ -0,0 +1,124 @@
+# posts/tests/test_api.py
+
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(title='api', slug='api-group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [Post.objects.create(author=cls.author, group=cls.group,
+                                         text=f'api post {i}')
+                     for i in range(12)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_feeds_and_cursor(self):
+        feeds = ((reverse('api:index'), 1),
+                 (reverse('api:group_posts', args=['api-group']), 2),
+                 (reverse('api:profile', args=['api_author']), 2))
+        for url, queries in feeds:
+            with self.assertNumQueries(queries):
+                _, data = self.get_json(url)
+            self.assertEqual([post['text'] for post in data['results']],
+                             [f'api post {i}' for i in range(11, 1, -1)])
+            self.assertEqual(data['results'][0]['author'], 'api_author')
+            self.assertEqual(data['results'][0]['group'], 'api-group')
+            self.assertIsNone(data['previous'])
+
+            _, data = self.get_json(url, after=data['next'])
+            self.assertEqual(len(data['results']), 2)
+            self.assertIsNone(data['next'])
+
+    def test_follow_feed_requires_login(self):
+        response = self.client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+        self.client.force_login(self.reader)
+        response, data = self.get_json(reverse('api:follow_index'),
+                                       limit=3)
+        self.assertEqual(len(data['results']), 3)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_conditional_get(self):
+        url = reverse('api:index')
+        response, _ = self.get_json(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+        Comment.objects.create(author=self.reader, post=self.posts[-1],
+                               text='свежий комментарий')
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+
+        self.posts[-1].text = 'исправленный текст'
+        self.posts[-1].save()
+        edited = self.client.get(url, HTTP_IF_NONE_MATCH=fresh['ETag'])
+        self.assertEqual(edited.status_code, 200)
+
+    def test_last_modified_advances_on_delete(self):
+        url = reverse('api:index')
+        response, _ = self.get_json(url)
+        later = time.time() + 10
+        with mock.patch('time.time', return_value=later):
+            self.posts[3].delete()
+        fresh = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(fresh.status_code, 200,
+                         "Удаление поста не сдвинуло Last-Modified")
+
+    def test_post_last_modified_advances_on_comment_delete(self):
+        post = self.posts[0]
+        comment = Comment.objects.create(author=self.reader, post=post,
+                                         text='удалённый комментарий')
+        url = reverse('api:post_view', args=['api_author', post.id])
+        response, _ = self.get_json(url)
+        with mock.patch('time.time', return_value=time.time() + 10):
+            comment.delete()
+        fresh = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(fresh.status_code, 200,
+                         "Удаление комментария не сдвинуло Last-Modified")
+
+    def test_post_view(self):
+        post = self.posts[0]
+        for i in range(3):
+            Comment.objects.create(author=self.reader, post=post,
+                                   text=f'api comment {i}')
+        _, data = self.get_json(
+            reverse('api:post_view', args=['api_author', post.id]), limit=2)
+        self.assertEqual(data['post']['id'], post.id)
+        self.assertEqual(data['post']['comments_count'], 3)
+        self.assertEqual([comment['text'] for comment in data['results']],
+                         ['api comment 2', 'api comment 1'])
+        self.assertIsNotNone(data['next'])
@@ -0,0 +1,44 @@
+# posts/tests/test_benchmark.py
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import Follow
+
+
+class BenchmarkTests(TestCase):
+
+    def test_benchmark_command(self):
+        call_command('seed_yatube', users=10, groups=2, posts=30,
+                     comments=30, follows=20, stdout=StringIO())
+        follows = set(Follow.objects.values_list('user_id', 'author_id'))
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            baseline = os.path.join(directory, 'baseline.json')
+            options = {'datasets': 'current', 'iterations': 2,
+                       'output': output, 'baseline': baseline,
+                       'stdout': StringIO()}
+            call_command('benchmark_yatube', save_baseline=True, **options)
+            with open(output) as source:
+                routes = json.load(source)['current']
+            self.assertIn('signup', routes)
+            self.assertIn('profile_unfollow', routes)
+            self.assertEqual(routes['index']['anonymous']['status'], 200)
+            self.assertEqual(routes['post_edit']['logged_in']['status'], 200)
+            self.assertEqual(
+                set(Follow.objects.values_list('user_id', 'author_id')),
+                follows, "Замер не должен менять подписки")
+
+            call_command('benchmark_yatube', threshold=10, **options)
+
+            routes['index']['logged_in']['queries'] = 0
+            with open(baseline, 'w') as target:
+                json.dump({'current': routes}, target)
+            with self.assertRaisesRegex(CommandError, 'index logged_in'):
+                call_command('benchmark_yatube', **options)
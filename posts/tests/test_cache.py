@@ -0,0 +1,152 @@
+# posts/tests/test_cache.py
+
+import tempfile
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from yatube.cache import FileCache, LocalLRU
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {'SHARED': 'shared', 'L1_MAX_ENTRIES': 2,
+                    'STALE_TIMEOUT': 60, 'LOCK_WAIT': 5,
+                    'L1_BYPASS': ('version:',)},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_local_lru_is_bounded(self):
+        lru = LocalLRU(2)
+        for key in 'abc':
+            lru.set(key, key, 10)
+        self.assertIsNone(lru.get('a'), "LRU не вытесняет старые записи")
+        self.assertEqual(lru.get('c'), 'c')
+
+    def test_value_survives_local_eviction(self):
+        for key in 'abc':
+            self.cache.set(key, key.upper())
+        self.assertEqual(self.cache.get('a'), 'A',
+                         "Значение не читается из общего кеша")
+
+    def test_stale_value_served_while_one_caller_refreshes(self):
+        self.cache.set('hot', 'old', 0.01)
+        time.sleep(0.02)
+        self.cache.local.clear()
+        self.assertIsNone(self.cache.get('hot'),
+                          "Первый читатель должен пересчитать значение")
+        self.assertEqual(self.cache.get('hot'), 'old',
+                         "Остальные читатели должны получить старое значение")
+        self.cache.set('hot', 'new', 60)
+        self.assertEqual(self.cache.get('hot'), 'new')
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        workers = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.cache.get_or_set('cold', compute, 60)))
+            for _ in range(5)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(calls), 1, "Значение пересчитано несколько раз")
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_waiter_does_not_release_foreign_lock(self):
+        # блокировку держит другой процесс, который считает дольше LOCK_WAIT
+        self.cache.lock_wait = 0.1
+        self.cache.shared.add('lock:busy', 'other', 30)
+        self.assertEqual(self.cache.get_or_set('busy', 'mine', 60), 'mine')
+        self.assertEqual(self.cache.shared.get('lock:busy'), 'other',
+                         "Ожидавший снял чужую блокировку пересчёта")
+        self.cache.set('busy', 'again')
+        self.assertEqual(self.cache.shared.get('lock:busy'), 'other')
+
+    def in_threads(self, target, count=5):
+        workers = [threading.Thread(target=target) for _ in range(count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_threads_share_local_cache(self):
+        self.cache.set('shared-l1', 'old')
+        self.in_threads(lambda: caches['default'].set('shared-l1', 'new'),
+                        count=1)
+        self.assertEqual(self.cache.get('shared-l1'), 'new',
+                         "Поток прочитал устаревшее значение из своего L1")
+
+    def test_bypassed_keys_see_deletes_from_other_threads(self):
+        self.cache.set('version:index', 1)
+        # у каждого потока свой экземпляр кеша, L1 у них общий
+        self.in_threads(lambda: caches['default'].delete('version:index'),
+                        count=1)
+        self.assertIsNone(self.cache.get('version:index'),
+                          "Версия ленты прочитана из устаревшего L1")
+
+    def test_incr_is_atomic(self):
+        self.cache.set('counter', 0)
+
+        def increment():
+            for _ in range(20):
+                caches['default'].incr('counter')
+
+        self.in_threads(increment)
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get('counter'), 100,
+                         "Параллельные incr потеряли обновления")
+
+
+class FileCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = FileCache(directory.name, {})
+
+    def test_add_is_atomic(self):
+        results = []
+        barrier = threading.Barrier(5)
+
+        def add():
+            barrier.wait()
+            results.append(self.cache.add('lock:hot', 1, 30))
+
+        workers = [threading.Thread(target=add) for _ in range(5)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(results.count(True), 1,
+                         "Блокировку получили несколько потоков")
+
+    def test_add_replaces_expired_value(self):
+        self.assertTrue(self.cache.add('lock:hot', 1, 0.01))
+        self.assertFalse(self.cache.add('lock:hot', 2, 30))
+        time.sleep(0.02)
+        self.assertTrue(self.cache.add('lock:hot', 3, 30))
+        self.assertEqual(self.cache.get('lock:hot'), 3)
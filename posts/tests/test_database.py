@@ -0,0 +1,76 @@
+# posts/tests/test_database.py
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.routers import STICKY_COOKIE
+from yatube.sqlite import apply_pragmas, read_pragmas
+
+User = get_user_model()
+
+
+class SQLitePragmasTests(TestCase):
+
+    def test_pragmas_applied_to_new_connections(self):
+        values = read_pragmas(connection, ['busy_timeout', 'cache_size',
+                                           'temp_store', 'synchronous'])
+        self.assertEqual(values['busy_timeout'],
+                         settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(values['cache_size'],
+                         settings.SQLITE_PRAGMAS['cache_size'])
+        # MEMORY = 2, NORMAL = 1
+        self.assertEqual(values['temp_store'], 2)
+        self.assertEqual(values['synchronous'], 1)
+
+    def test_pragma_values_validated(self):
+        with self.assertRaises(ValueError):
+            apply_pragmas(connection, {'cache_size': '1; DROP TABLE x'})
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='replica_author')
+        self.reader = User.objects.create_user(username='replica_reader')
+        Post.objects.create(author=self.author, text='Пост с реплики')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connection) as primary:
+            response = self.client.get(url)
+        return response, len(replica), len(primary)
+
+    def test_feed_reads_go_to_replica(self):
+        for url in (reverse('index'),
+                    reverse('profile', args=['replica_author'])):
+            response, replica, primary = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(replica, 0)
+            self.assertEqual(primary, 0)
+
+        _, replica, _ = self.get(reverse('new_post'))
+        self.assertEqual(replica, 0, "Формы читают из основной базы")
+
+    def test_reads_stick_to_primary_after_write(self):
+        response, _, _ = self.get(
+            reverse('profile_follow', args=['replica_author']))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'],
+                         settings.REPLICA_STICKY_SECONDS)
+
+        response, replica, primary = self.get(reverse('follow_index'))
+        self.assertContains(response, 'Пост с реплики')
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
@@ -0,0 +1,111 @@
+# posts/tests/test_metrics.py
+
+import json
+import os
+import re
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.metrics import Timings, registry
+from yatube.slow_queries import JsonFormatter, SlowQueryLogger, fingerprint
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.author = User.objects.create_user(username='metrics_author')
+        Post.objects.create(author=cls.author, text='Замеряемый пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('index'))
+        header = response['Server-Timing']
+        for part in ('db', 'tpl', 'cache', 'total'):
+            self.assertRegex(header, rf'\b{part};dur=\d+\.\d')
+        queries = int(re.search(r'"(\d+) queries"', header).group(1))
+        self.assertGreater(queries, 0)
+
+    def test_metrics_staff_only(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('profile', args=['metrics_author']))
+        self.client.get('/no/such/page/here/')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('yatube_request_duration_seconds_count{view="index"} 1',
+                      body)
+        self.assertIn('yatube_request_db_seconds_bucket{view="profile",'
+                      'le="+Inf"} 1', body)
+        self.assertIn('yatube_responses_total{view="unnamed",status="404"} 1',
+                      body)
+
+    def test_nested_time_counted_once(self):
+        timings = Timings()
+
+        def query():
+            time.sleep(0.02)
+
+        def render():
+            timings.measure('db', query)
+
+        timings.measure('tpl', render)
+        self.assertGreaterEqual(timings.totals['db'], 0.02)
+        self.assertLess(timings.totals['tpl'], 0.01)
+
+    def test_slow_query_log(self):
+        self.assertTrue(any(isinstance(wrapper, SlowQueryLogger)
+                            for wrapper in connection.execute_wrappers))
+        with self.assertLogs('yatube.slow_queries') as logs:
+            with connection.execute_wrapper(SlowQueryLogger(connection, 0)):
+                self.client.get(reverse('profile', args=['metrics_author']))
+        entries = [record.slow_query for record in logs.records]
+        posts = [entry for entry in entries
+                 if 'FROM "posts_post"' in entry['sql']]
+        self.assertTrue(posts)
+        entry = posts[0]
+        self.assertEqual(entry['view'], 'profile')
+        self.assertTrue(entry['location'].startswith('posts/'))
+        self.assertTrue(entry['plan'])
+        self.assertIsInstance(entry['duration_ms'], float)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            formatter = JsonFormatter()
+            with open(path, 'w') as log, open(path + '.1', 'w') as backup:
+                for record in logs.records:
+                    log.write(formatter.format(record) + '\n')
+                backup.write(json.dumps(entry) + '\n')
+            out = StringIO()
+            call_command('slow_query_report', log=path, stdout=out)
+        report = out.getvalue()
+        self.assertIn(f'Медленных запросов: {len(entries) + 1}', report)
+        self.assertIn('маршруты: profile', report)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 5 AND b IN (%s, %s)\n"
+                        "  AND c = 'x''y'"),
+            fingerprint("SELECT * FROM t WHERE a = 17 AND b IN (%s, %s, %s) "
+                        "AND c = 'z'"))
@@ -0,0 +1,87 @@
+# posts/tests/test_search.py
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='SearchAuthor')
+        cls.second_user = User.objects.create_user(username='SearchOther')
+        cls.group = Group.objects.create(title='search group',
+                                         slug='search-group')
+
+    def setUp(self):
+        self.unauthorized_client = Client()
+
+    def test_search(self):
+        other_group = Group.objects.create(title='other', slug='search-other')
+        Post.objects.create(author=self.user, group=self.group,
+                            text='<b>котики</b> и собаки')
+        Post.objects.create(author=self.second_user, group=other_group,
+                            text='котики котики котики')
+        Post.objects.create(author=self.user, text='только собаки')
+
+        response = self.unauthorized_client.get(reverse('search'),
+                                                {'q': 'котик'})
+        found = list(response.context['page'])
+        self.assertEqual([post.text for post in found],
+                         ['котики котики котики', '<b>котики</b> и собаки'],
+                         "Результаты не отсортированы по BM25")
+        content = response.content.decode()
+        self.assertIn('<mark>котики</mark>', content)
+        self.assertNotIn('<b>котики</b>', content,
+                         "Текст поста в сниппете не экранирован")
+
+        response = self.unauthorized_client.get(
+            reverse('search'), {'q': 'котики', 'group': self.group.slug})
+        self.assertEqual(len(response.context['page']), 1)
+
+        Post.objects.filter(text='только собаки').update(text='только ежи')
+        response = self.unauthorized_client.get(reverse('search'),
+                                                {'q': 'ежи'})
+        self.assertEqual(len(response.context['page']), 1,
+                         "Индекс не обновился после изменения текста")
+
+    def test_search_cursor(self):
+        for i in range(12):
+            Post.objects.create(author=self.user, text=f'курсор {i}')
+        first = self.unauthorized_client.get(reverse('search'),
+                                             {'q': 'курсор'})
+        page = first.context['page']
+        self.assertTrue(page.has_next())
+        second = self.unauthorized_client.get(
+            reverse('search'), {'q': 'курсор', 'after': page.next_cursor})
+        first_ids = {post.id for post in page}
+        second_ids = {post.id for post in second.context['page']}
+        self.assertEqual(len(first_ids | second_ids), 12)
+        self.assertFalse(first_ids & second_ids)
+
+    def test_rebuild_search_index_command(self):
+        Post.objects.create(author=self.user, text='переиндексация')
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        response = self.unauthorized_client.get(reverse('search'),
+                                                {'q': 'переиндексация'})
+        self.assertEqual(len(response.context['page']), 1)
+        self.assertNotIn('posts_post_fts_new',
+                         connection.introspection.table_names(),
+                         "Теневая таблица осталась после подмены")
+
+        post = Post.objects.get(text='переиндексация')
+        post.text = 'после подмены'
+        post.save()
+        response = self.unauthorized_client.get(reverse('search'),
+                                                {'q': 'подмены'})
+        self.assertEqual(len(response.context['page']), 1,
+                         "Триггеры индекса не восстановлены")
@@ -0,0 +1,43 @@
+# posts/tests/test_seed.py
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Max, Min
+from django.test import TestCase
+
+from posts.management.commands.seed_yatube import EPOCH
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class SeedTests(TestCase):
+
+    def test_seed_yatube_command(self):
+        options = {'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+                   'follows': 100, 'batch_size': 50, 'stdout': StringIO()}
+        call_command('seed_yatube', **options)
+        seeded = User.objects.filter(username__startswith='seed_user_')
+        self.assertEqual(seeded.count(), 30)
+        self.assertEqual(Post.objects.filter(author__in=seeded).count(), 200)
+        self.assertEqual(Follow.objects.filter(user__in=seeded).count(), 100)
+        dates = Post.objects.filter(author__in=seeded).aggregate(
+            first=Min('pub_date'), last=Max('pub_date'))
+        self.assertEqual(dates['first'], EPOCH - timedelta(days=365),
+                         "Даты постов зависят от времени запуска")
+        self.assertLess(dates['last'], EPOCH)
+
+        call_command('seed_yatube', **options)
+        self.assertEqual(Post.objects.filter(author__in=seeded).count(), 200,
+                         "Повторный запуск должен только дополнять набор")
+        call_command('seed_yatube', grow=True, **options)
+        self.assertEqual(Post.objects.filter(author__in=seeded).count(), 400)
+        self.assertEqual(seeded.count(), 60)
+        self.assertEqual(Follow.objects.filter(user__in=seeded).count(), 200)
+
+        busiest = UserStats.objects.order_by('-followers_count').first()
+        self.assertGreater(busiest.followers_count, 100 / 60 * 3,
+                           "Подписки распределены не по степенному закону")
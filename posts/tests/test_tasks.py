@@ -0,0 +1,171 @@
+# posts/tests/test_tasks.py
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.feed_cache import bump, version
+from posts.models import Follow, Group, Post, Task
+from posts.tasks import Worker, task
+
+User = get_user_model()
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def flaky(value):
+    calls.append(value)
+    if calls.count(value) < 2:
+        raise RuntimeError('временный сбой')
+
+
+@task(max_attempts=1)
+def broken():
+    raise RuntimeError('всегда падает')
+
+
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker('test')
+
+    def drain(self):
+        while self.worker.run_once():
+            pass
+
+    def test_priority_and_dedup(self):
+        record.enqueue('low')
+        record.enqueue('high', priority=10)
+        first = record.enqueue('dup', dedup_key='same')
+        self.assertEqual(record.enqueue('dup', dedup_key='same'), first,
+                         "Дубль по ключу встал в очередь")
+        self.drain()
+        self.assertEqual(calls, ['high', 'low', 'dup'])
+        self.assertFalse(Task.objects.exists(),
+                         "Выполненные задачи не удалены")
+        record.enqueue('again', dedup_key='same')
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_retry_with_backoff(self):
+        flaky.enqueue('x')
+        with self.assertLogs('posts.tasks', 'WARNING'):
+            self.assertTrue(self.worker.run_once())
+        retry = Task.objects.get()
+        self.assertEqual((retry.status, retry.attempts),
+                         (Task.QUEUED, 1))
+        self.assertGreater(retry.available_at, timezone.now())
+        self.assertIn('временный сбой', retry.last_error)
+        self.assertFalse(self.worker.run_once(),
+                         "Повтор запущен раньше задержки")
+
+        Task.objects.update(available_at=timezone.now())
+        self.drain()
+        self.assertEqual(calls, ['x', 'x'])
+        self.assertFalse(Task.objects.exists())
+
+        broken.enqueue()
+        with self.assertLogs('posts.tasks', 'WARNING'):
+            self.drain()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_visibility_timeout(self):
+        record.enqueue('lost')
+        claimed = self.worker.claim()
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertIsNone(Worker('other').claim(),
+                          "Задачу забрали до истечения аренды")
+
+        Task.objects.update(available_at=timezone.now() - timedelta(1))
+        other = Worker('other')
+        self.assertTrue(other.run_once())
+        self.assertEqual(calls, ['lost'])
+        self.worker.execute(claimed)
+        self.assertEqual(calls, ['lost', 'lost'])
+
+
+class RunWorkersTests(TransactionTestCase):
+
+    def test_password_reset_mail_sent_by_worker(self):
+        User.objects.create_user(username='reset', email='reset@example.com',
+                                 password='secret-password')
+        self.client.post(reverse('password_reset'),
+                         {'email': 'reset@example.com'})
+        self.assertEqual(len(mail.outbox), 0,
+                         "Письмо отправлено прямо из запроса")
+        queued = Task.objects.get()
+        self.assertEqual(queued.name, 'users.tasks.send_password_reset')
+        self.assertNotIn('reset/', queued.payload,
+                         "Ссылка с токеном сброса лежит в очереди")
+
+        call_command('run_workers', workers=2, burst=True,
+                     stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reset@example.com'])
+        self.assertIn('/reset/', mail.outbox[0].body)
+        self.assertFalse(Task.objects.exists())
+
+    def test_group_change_bumps_follower_feeds_in_background(self):
+        author = User.objects.create_user(username='group-author')
+        reader = User.objects.create_user(username='group-reader')
+        Follow.objects.create(user=reader, author=author)
+        group = Group.objects.create(title='старое имя', slug='renamed')
+        Post.objects.create(author=author, group=group, text='в группе')
+        Post.objects.create(author=author, group=group, text='ещё один')
+        Task.objects.all().delete()
+        before = version(f'follower:{reader.pk}')
+
+        group.title = 'новое имя'
+        group.save()
+        self.assertEqual(version(f'follower:{reader.pk}'), before,
+                         "Ленты подписчиков обходятся прямо в запросе")
+        self.assertEqual(
+            Task.objects.get().name,
+            'posts.feed_cache.bump_author_followers_in_background')
+        call_command('run_workers', burst=True, stdout=StringIO())
+        self.assertNotEqual(version(f'follower:{reader.pk}'), before)
+
+    def test_post_edit_bumps_follower_feeds_in_background(self):
+        author = User.objects.create_user(username='busy-author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(author=author, text='первая версия')
+        before = version(f'follower:{reader.pk}')
+
+        post.text = 'вторая версия'
+        post.save()
+        self.assertEqual(version(f'follower:{reader.pk}'), before,
+                         "Ленты подписчиков обходятся прямо в запросе")
+        self.assertEqual(
+            Task.objects.get().name,
+            'posts.feed_cache.bump_author_followers_in_background')
+
+        call_command('run_workers', burst=True, stdout=StringIO())
+        self.assertNotEqual(version(f'follower:{reader.pk}'), before)
+
+    @override_settings(REPLICA_DATABASE='replica', REPLICA_MAX_LAG=5)
+    def test_replica_bump_repeated_by_delayed_task(self):
+        bump('index')
+        repeat = Task.objects.get()
+        self.assertEqual(repeat.name, 'posts.feed_cache.forget_versions')
+        self.assertGreater(repeat.available_at,
+                           timezone.now() + timedelta(seconds=4))
+        before = version('index')
+
+        call_command('run_workers', burst=True, stdout=StringIO())
+        self.assertEqual(version('index'), before,
+                         "Версия сброшена раньше REPLICA_MAX_LAG")
+        Task.objects.update(available_at=timezone.now())
+        call_command('run_workers', burst=True, stdout=StringIO())
+        self.assertNotEqual(version('index'), before)
@@ -1,11 +1,27 @@
 # posts/tests/tests_views.py
 
+import os
+import re
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from PIL import Image
+from django.db import IntegrityError, transaction
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_http_date
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from posts.models import Post, Group
+from posts import feed_cache
+from posts.cards import card_key
+from posts.models import Post, Group, Comment, Follow, UserStats
+from posts.pagination import encode_token, feed_count, page_window
+from posts.templatetags.pagination import after_cursor
+from yatube.metrics import registry
 
 User = get_user_model()
 
@@ -21,6 +37,7 @@ class ViewsTests(TestCase):
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.user)
         cls.group = Group.objects.create(title='test_group', slug='test-group')
+        cache.clear()
 
     def test_new_post_on_pages(self):
         new_post = Post.objects.create(author=self.user,
@@ -113,13 +130,45 @@ class ViewsTests(TestCase):
                              'или не является изображением.')
 
     def test_cache_index(self):
-        testing_post = self.authorized_client.post(
+        cached_post = Post.objects.create(author=self.user,
+                                          text='cache checking')
+        self.authorized_client.get(reverse('index'))
+        Post.objects.filter(pk=cached_post.pk).update(text='silent update')
+        index = self.authorized_client.get(reverse('index'))
+        self.assertIn('cache checking', index.content.decode(),
+                      "Страница не закеширована")
+
+        self.authorized_client.post(
             reverse('new_post'),
-            {'text': 'cache checking', 'group': self.group.id, },
-            follow=True)
+            {'text': 'fresh cache', 'group': self.group.id, })
         index = self.authorized_client.get(reverse('index'))
-        self.assertFalse('cache checking' in str(index.content),
-                         "Страница не закеширована")
+        self.assertIn('fresh cache', index.content.decode(),
+                      "Кеш не сброшен после нового поста")
+        self.assertIn('silent update', index.content.decode())
+
+    def test_cache_scopes(self):
+        other_group = Group.objects.create(title='other', slug='other')
+        post = Post.objects.create(author=self.user, group=self.group,
+                                   text='scoped')
+        group_url = reverse('group_posts', args=[self.group.slug])
+        other_url = reverse('group_posts', args=[other_group.slug])
+        self.unauthorized_client.get(group_url)
+        self.unauthorized_client.get(other_url)
+
+        Comment.objects.create(author=self.second_user, post=post,
+                               text='c')
+        response = self.unauthorized_client.get(group_url)
+        self.assertIn('Комментариев: 1', response.content.decode(),
+                      "Комментарий не сбросил кеш группы")
+
+        post.group = other_group
+        post.save()
+        self.assertNotIn('scoped',
+                         self.unauthorized_client.get(group_url)
+                         .content.decode())
+        self.assertIn('scoped',
+                      self.unauthorized_client.get(other_url)
+                      .content.decode())
 
     def test_auth_user_follow(self):
         follow = self.authorized_client.post(
@@ -189,3 +238,451 @@ class ViewsTests(TestCase):
         self.assertEqual(commented_post.context['comments'][0].text,
                          'comment from auth',
                          "Получен неверный комментарий")
+
+    def test_cursor_pagination(self):
+        for i in range(12):
+            Post.objects.create(author=self.second_user, text=f'cursor {i}')
+        first_page = self.unauthorized_client.get(reverse('index'))
+        first_ids = [post.id for post in first_page.context['page']]
+        next_link = re.search(r'\?after=([\w-]+)',
+                              first_page.content.decode())
+        self.assertIsNotNone(next_link, "Нет ссылки на следующую страницу")
+
+        Post.objects.create(author=self.second_user, text='fresh post')
+        second_page = self.unauthorized_client.get(
+            reverse('index'), {'after': next_link.group(1)})
+        second_ids = [post.id for post in second_page.context['page']]
+        self.assertTrue(second_ids, "Вторая страница пуста")
+        self.assertFalse(set(first_ids) & set(second_ids),
+                         "Страницы пересекаются после добавления поста")
+        self.assertLess(max(second_ids), min(first_ids))
+
+        back = self.unauthorized_client.get(
+            reverse('index'),
+            {'before': second_page.context['page'].previous_cursor})
+        self.assertEqual([post.id for post in back.context['page']],
+                         first_ids)
+
+    def test_follow_index_cursor_pagination(self):
+        reader = User.objects.create_user(username='CursorReader')
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse('profile_follow', args=[self.second_user]))
+        posts = [Post.objects.create(author=self.second_user,
+                                     text=f'timeline {i}')
+                 for i in range(12)]
+        expected = [post.id for post in reversed(posts)]
+
+        first_page = client.get(reverse('follow_index')).context['page']
+        self.assertEqual([post.id for post in first_page], expected[:10])
+        second_page = client.get(
+            reverse('follow_index'),
+            {'after': after_cursor(first_page)}).context['page']
+        self.assertEqual([post.id for post in second_page], expected[10:],
+                         "Курсор ленты подписок ведёт не туда")
+        back = client.get(reverse('follow_index'),
+                          {'before': second_page.previous_cursor})
+        self.assertEqual([post.id for post in back.context['page']],
+                         expected[:10])
+
+    def test_cursor_pagination_broken_token(self):
+        response = self.unauthorized_client.get(reverse('index'),
+                                                {'after': '%%%'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_feed_query_budget(self):
+        follower = User.objects.create_user(username='BudgetReader')
+        Follow.objects.create(user=follower, author=self.second_user)
+        for i in range(15):
+            post = Post.objects.create(author=self.second_user,
+                                       group=self.group,
+                                       text=f'budget {i}')
+            Comment.objects.create(author=self.user, post=post, text='c')
+        client = Client()
+        client.force_login(follower)
+        # два запроса из каждого бюджета уходят на сессию и пользователя
+        budgets = [
+            (reverse('index'), 5),
+            (reverse('group_posts', args=[self.group.slug]), 5),
+            (reverse('profile', args=[self.second_user]), 7),
+            (reverse('follow_index'), 5),
+            (reverse('post_view', args=[self.second_user, post.id]), 4),
+        ]
+        for url, budget in budgets:
+            cache.clear()
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_timeline_backfill_and_removal(self):
+        reader = User.objects.create_user(username='TimelineReader')
+        client = Client()
+        client.force_login(reader)
+        old_post = Post.objects.create(author=self.second_user,
+                                       text='before follow')
+        client.get(reverse('profile_follow', args=[self.second_user]))
+        self.assertTrue(reader.timeline.filter(post=old_post).exists(),
+                        "Старые посты автора не попали в ленту")
+
+        new_post = Post.objects.create(author=self.second_user,
+                                       text='after follow')
+        self.assertTrue(reader.timeline.filter(post=new_post).exists(),
+                        "Новый пост не разослан подписчикам")
+
+        client.get(reverse('profile_unfollow', args=[self.second_user]))
+        self.assertFalse(reader.timeline.exists(),
+                         "Посты автора остались в ленте после отписки")
+
+    def test_timeline_follows_model_changes(self):
+        reader = User.objects.create_user(username='AdminReader')
+        post = Post.objects.create(author=self.second_user,
+                                   text='до подписки из админки')
+        follow = Follow.objects.create(user=reader, author=self.second_user)
+        self.assertTrue(reader.timeline.filter(post=post).exists(),
+                        "Подписка не из вьюхи не заполнила ленту")
+        follow.delete()
+        self.assertFalse(reader.timeline.exists(),
+                         "Отписка не из вьюхи не очистила ленту")
+
+    def test_profile_counters(self):
+        author = User.objects.create_user(username='CountedAuthor')
+        reader = User.objects.create_user(username='CountedReader')
+        client = Client()
+        client.force_login(reader)
+        post = Post.objects.create(author=author, text='counted')
+        Post.objects.create(author=author, text='counted too')
+        client.get(reverse('profile_follow', args=[author]))
+
+        response = client.get(reverse('profile', args=[author]))
+        stats = response.context['stats']
+        self.assertEqual((stats.posts_count, stats.followers_count,
+                          stats.following_count), (2, 1, 0))
+        self.assertEqual(UserStats.of(reader).following_count, 1)
+
+        post.delete()
+        client.get(reverse('profile_unfollow', args=[author]))
+        author.refresh_from_db()
+        self.assertEqual((author.stats.posts_count,
+                          author.stats.followers_count), (1, 0))
+
+    def test_counter_does_not_go_below_zero(self):
+        author = User.objects.create_user(username='BulkAuthor')
+        Post.objects.create(author=author, text='counted')
+        Post.objects.bulk_create([Post(author=author, text='not counted')])
+        author.posts.all().delete()
+        author.refresh_from_db()
+        self.assertEqual(author.stats.posts_count, 0,
+                         "Удаление поста из bulk_create сломало счётчик")
+
+    def test_follow_is_idempotent(self):
+        author = User.objects.create_user(username='IdempotentAuthor')
+        reader = User.objects.create_user(username='IdempotentReader')
+        client = Client()
+        client.force_login(reader)
+        follow_url = reverse('profile_follow', args=[author])
+        client.get(follow_url)
+        # сессия, пользователь, автор и один INSERT в точке сохранения
+        with self.assertNumQueries(6):
+            client.get(follow_url)
+        self.assertTrue(Follow.objects.follow(reader, author) is False)
+        self.assertEqual(Follow.objects.filter(user=reader).count(), 1)
+        self.assertEqual(UserStats.of(author).followers_count, 1)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=reader, author=author)
+
+        for _ in range(2):
+            client.get(reverse('profile_unfollow', args=[author]))
+        self.assertFalse(Follow.objects.filter(user=reader).exists())
+        author.refresh_from_db()
+        self.assertEqual(author.stats.followers_count, 0)
+
+    def test_follow_many(self):
+        reader = User.objects.create_user(username='OnboardingReader')
+        authors = [User.objects.create_user(username=f'Onboarding{i}')
+                   for i in range(3)]
+        Follow.objects.follow(reader, authors[0])
+        Post.objects.create(author=authors[1], text='для новичка')
+        client = Client()
+        client.force_login(reader)
+        response = client.post(
+            reverse('follow_many'),
+            {'username': [author.username for author in authors]
+             + ['OnboardingReader', 'nobody']})
+        self.assertRedirects(response, reverse('follow_index'))
+        self.assertEqual(
+            set(reader.follower.values_list('author__username', flat=True)),
+            {author.username for author in authors})
+        self.assertEqual(UserStats.of(reader).following_count, 3)
+        for author in authors:
+            author.refresh_from_db()
+            self.assertEqual(UserStats.of(author).followers_count, 1)
+        self.assertContains(client.get(reverse('follow_index')),
+                            'для новичка')
+
+    def test_follow_many_is_set_based(self):
+        reader = User.objects.create_user(username='BulkReader')
+        client = Client()
+        client.force_login(reader)
+        names = []
+        for i in range(8):
+            author = User.objects.create_user(username=f'Bulk{i}')
+            names.append(author.username)
+            for j in range(3):
+                Post.objects.create(author=author, text=f'bulk {i} {j}')
+        # число запросов не зависит от числа авторов: одна вставка
+        # подписок, по одному UPDATE счётчиков и одна вставка в ленту
+        with self.settings(TIMELINE_BACKFILL_SIZE=2), \
+                self.assertNumQueries(15):
+            client.post(reverse('follow_many'), {'username': names})
+        self.assertEqual(reader.timeline.count(), 16,
+                         "Лента заполнена не по два поста каждого автора")
+        self.assertEqual(UserStats.of(reader).following_count, 8)
+
+    def test_recount_user_stats_command(self):
+        author = User.objects.create_user(username='DriftedAuthor')
+        Post.objects.create(author=author, text='drift')
+        UserStats.objects.filter(user=author).update(posts_count=42,
+                                                     followers_count=7)
+        call_command('recount_user_stats', batch_size=1, stdout=StringIO())
+        author.refresh_from_db()
+        self.assertEqual((author.stats.posts_count,
+                          author.stats.followers_count), (1, 0))
+
+    def test_thumbnail_created_on_upload(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (50, 50), (255, 0, 0)).save(buffer, 'png')
+        image = SimpleUploadedFile('thumb.png', buffer.getvalue(),
+                                   content_type='image/png')
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0):
+            self.authorized_client.post(reverse('new_post'),
+                                        {'text': 'with thumbnail',
+                                         'image': image})
+            post = Post.objects.get(text='with thumbnail')
+            self.assertEqual((post.thumbnail_width, post.thumbnail_height),
+                             (960, 339))
+            self.assertTrue(os.path.exists(
+                os.path.join(media_root, post.thumbnail)))
+            response = self.authorized_client.get(reverse('index'))
+            self.assertIn(post.thumbnail_url, response.content.decode(),
+                          "Страница не использует готовую миниатюру")
+
+            buffer = BytesIO()
+            Image.new('RGB', (50, 50), (0, 0, 255)).save(buffer, 'png')
+            self.authorized_client.post(
+                reverse('post_edit', args=[self.user.username, post.pk]),
+                {'text': 'with thumbnail',
+                 'image': SimpleUploadedFile('thumb.png', buffer.getvalue(),
+                                             content_type='image/png')})
+            old_thumbnail = post.thumbnail
+            post.refresh_from_db()
+            self.assertNotEqual(post.thumbnail, old_thumbnail,
+                                "У новой картинки прежний URL миниатюры")
+
+    def upload(self, size, **limits):
+        buffer = BytesIO()
+        Image.new('RGB', size, (0, 128, 0)).save(buffer, 'png')
+        image = SimpleUploadedFile('big.png', buffer.getvalue(),
+                                   content_type='image/png')
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0,
+                              **limits):
+            response = self.authorized_client.post(
+                reverse('new_post'), {'text': 'bounded', 'image': image})
+            post = Post.objects.filter(text='bounded').first()
+            stored = Image.open(post.image.path).size if post else None
+        return response, stored
+
+    def test_upload_rejected_by_byte_limit(self):
+        response, stored = self.upload((200, 200), POST_IMAGE_MAX_BYTES=100)
+        self.assertIsNone(stored, "Слишком большой файл сохранён")
+        self.assertIn('МБ', response.context['form'].errors['image'][0])
+
+    def test_upload_rejected_by_pixel_limit(self):
+        response, stored = self.upload((200, 200), POST_IMAGE_MAX_PIXELS=10)
+        self.assertIsNone(stored, "Слишком большая картинка сохранена")
+        self.assertIn('мегапикселей',
+                      response.context['form'].errors['image'][0])
+
+    def test_upload_limits_only_on_post_forms(self):
+        self.assertNotIn('posts.uploads.BoundedImageUploadHandler',
+                         settings.FILE_UPLOAD_HANDLERS,
+                         "Обработчик загрузок заменён для всего сайта")
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('new_post'), {'text': 'без токена'})
+        self.assertEqual(response.status_code, 403,
+                         "Форма поста принимается без CSRF-токена")
+
+    def test_oversized_original_downscaled(self):
+        response, stored = self.upload((300, 120), POST_IMAGE_MAX_SIDE=100)
+        self.assertEqual(stored, (100, 40))
+
+    def test_paginator_window_and_cached_count(self):
+        for i in range(60):
+            Post.objects.create(author=self.second_user, text=f'window {i}')
+        url = reverse('profile', args=[self.second_user])
+        response = self.unauthorized_client.get(url, {'page': 4})
+        paginator = response.context['paginator']
+        self.assertEqual(paginator.count, 51,
+                         "Записи за нумерованными страницами посчитаны")
+        self.assertEqual(page_window(paginator, 4), [1, 2, 3, 4, 5, None])
+        self.assertEqual(page_window(paginator, 1),
+                         [1, 2, 3, None, 5, None])
+        self.assertEqual(response.content.decode().count('?page='), 5)
+        self.assertRedirects(
+            self.unauthorized_client.get(url, {'page': 60}),
+            f'{url}?page=5',
+            msg_prefix="Старая ссылка на дальнюю страницу не перенаправлена")
+
+        posts = self.user.posts.all()
+        scope = f'author:{self.user.pk}'
+        Post.objects.create(author=self.user, text='counted once')
+        self.assertEqual(feed_count(posts, 10, scope=scope), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(feed_count(posts, 10, scope=scope), 1)
+        Post.objects.create(author=self.user, text='window new')
+        self.assertEqual(
+            feed_count(posts, 10, scope=scope), 2,
+            "Кешированное число записей не сброшено после нового поста")
+
+    def test_cursor_id_out_of_range(self):
+        token = encode_token(f'{timezone.now().isoformat()},{2 ** 64}')
+        response = self.unauthorized_client.get(reverse('index'),
+                                                {'after': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_post_comments_paginated(self):
+        post = Post.objects.create(author=self.user, text='много мнений')
+        Comment.objects.bulk_create(
+            Comment(author=self.second_user, post=post, text=f'мнение {i}')
+            for i in range(25))
+        response = self.authorized_client.get(
+            reverse('post_view', args=[self.user, post.id]))
+        page = response.context['comment_page']
+        self.assertEqual(len(page), 20)
+        self.assertEqual(page[0].text, 'мнение 24')
+        self.assertTrue(page.has_next())
+
+        with self.assertNumQueries(2):
+            fragment = self.authorized_client.get(
+                reverse('post_comments', args=[self.user, post.id]),
+                {'after': page.next_cursor})
+        self.assertNotContains(fragment, '<html')
+        texts = [item.text for item in fragment.context['comment_page']]
+        self.assertEqual(texts, [f'мнение {i}' for i in range(4, -1, -1)])
+        self.assertNotContains(fragment, 'Показать ещё')
+
+    def test_conditional_feed_pages(self):
+        post = Post.objects.create(author=self.second_user, group=self.group,
+                                   text='кешируемый пост')
+        client = Client()
+        # анонимные страницы отдаёт кеш страниц, поэтому без запросов
+        pages = ((reverse('index'), 0),
+                 (reverse('group_posts', args=[self.group.slug]), 0),
+                 (reverse('profile', args=[self.second_user]), 0))
+        etags = {}
+        for url, queries in pages:
+            response = client.get(url)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('max-age=10', response['Cache-Control'])
+            self.assertIn('Cookie', response['Vary'])
+            etags[url] = response['ETag']
+            with self.assertNumQueries(queries):
+                cached = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(cached.status_code, 304,
+                             "Неизменившаяся лента должна отдавать 304")
+            cached = client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(cached.status_code, 304)
+
+        Comment.objects.create(author=self.user, post=post, text='новость')
+        for url, _ in pages:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200,
+                             "Комментарий должен менять ETag ленты")
+
+        url = reverse('profile', args=[self.second_user])
+        etag = client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=self.second_user)
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200,
+            "Число подписчиков в профиле изменилось")
+
+        response = self.authorized_client.get(reverse('index'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], client.get(
+            reverse('index'))['ETag'])
+
+    def test_last_modified_not_before_change(self):
+        feed_cache.touch('index')
+        response = Client().get(reverse('index'))
+        self.assertGreaterEqual(
+            parse_http_date(response['Last-Modified']),
+            feed_cache.last_modified('index'),
+            "Last-Modified раньше последнего изменения ленты")
+
+    def test_anonymous_page_cache(self):
+        post = Post.objects.create(author=self.second_user, group=self.group,
+                                   text='страница из кеша')
+        client = Client()
+        urls = (reverse('index'),
+                reverse('group_posts', args=[self.group.slug]),
+                reverse('profile', args=[self.second_user]),
+                reverse('post_view', args=[self.second_user, post.id]))
+        for url in urls:
+            self.assertEqual(client.get(url)['X-Page-Cache'], 'miss')
+            with self.assertNumQueries(0):
+                response = client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+            self.assertContains(response, 'страница из кеша')
+
+        self.assertNotIn('X-Page-Cache', self.authorized_client.get(
+            urls[0]), "Залогиненным страницы из кеша не отдаются")
+        client.cookies['csrftoken'] = 'token'
+        self.assertNotIn('X-Page-Cache', client.get(urls[0]))
+        del client.cookies['csrftoken']
+
+        Comment.objects.create(author=self.user, post=post,
+                               text='комментарий сбрасывает кеш')
+        for url in urls:
+            response = client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'комментарий сбрасывает кеш')
+
+        other_group = Group.objects.create(title='другая', slug='other')
+        Post.objects.create(author=self.user, group=other_group, text='x')
+        self.assertEqual(client.get(urls[1])['X-Page-Cache'], 'hit',
+                         "Пост в другом сообществе не трогает эту страницу")
+        self.assertEqual(client.get(urls[0])['X-Page-Cache'], 'miss')
+        self.assertGreater(registry.page_cache[('post_view', 'hit')], 0)
+        self.assertGreater(registry.page_cache[('index', 'bypass')], 0)
+
+    def test_post_cards_shared_between_viewers(self):
+        post = Post.objects.create(author=self.user, group=self.group,
+                                   text='общая карточка')
+        edit_url = reverse('post_edit', args=[self.user, post.id])
+        reader = Client()
+        reader.force_login(self.second_user)
+        urls = (reverse('index'),
+                reverse('group_posts', args=[self.group.slug]),
+                reverse('profile', args=[self.user]),
+                reverse('post_view', args=[self.user, post.id]))
+        for url in urls:
+            cache.clear()
+            self.assertContains(self.authorized_client.get(url), edit_url)
+            self.assertNotContains(reader.get(url), edit_url,
+                                   msg_prefix="Кнопка автора попала в кеш")
+            card = cache.get(card_key(Post.objects.for_feed().get(pk=post.pk)))
+            self.assertIn('общая карточка', card,
+                          f"Карточка не закеширована на {url}")
+            self.assertNotIn(edit_url, card)
+
+        Comment.objects.create(author=self.second_user, post=post, text='c')
+        self.assertContains(reader.get(urls[3]), 'Комментариев: 1')
+        post.group = Group.objects.create(title='новая группа', slug='new')
+        post.save()
+        self.assertContains(reader.get(urls[3]), '#новая группа')
@@ -0,0 +1,43 @@
+# posts/tests/test_warmup.py
+
+import threading
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from posts.models import Post, Task
+
+
+class WarmupTests(TransactionTestCase):
+    # страницы рендерятся в отдельных потоках со своими соединениями,
+    # поэтому данные должны быть закоммичены
+
+    def test_warmup_command(self):
+        call_command('seed_yatube', users=10, groups=2, posts=30,
+                     comments=30, follows=20, stdout=StringIO())
+        cache.clear()
+        out = StringIO()
+        call_command('warmup', pages=2, groups=2, profiles=2, workers=2,
+                     host='testserver', stdout=out)
+        self.assertRegex(out.getvalue(), r'Шаблонов: [1-9]')
+        self.assertIn(f'200 {reverse("index")}?page=2', out.getvalue())
+        self.assertIn('не успели: 0', out.getvalue())
+        response = Client().get(reverse('index'))
+        self.assertEqual(response['X-Page-Cache'], 'hit',
+                         "Главная не попала в кеш при прогреве")
+
+        post = Post.objects.first()
+        Post.objects.filter(pk=post.pk).update(image='posts/missing.jpg')
+        out = StringIO()
+        call_command('warmup', budget=0, stdout=out)
+        self.assertNotIn('200 ', out.getvalue())
+        self.assertIn('миниатюр в очереди: 1', out.getvalue())
+        self.assertEqual(Task.objects.get().dedup_key, f'thumbnail:{post.pk}',
+                         "Миниатюры должны строить воркеры очереди")
+        self.assertFalse(
+            [thread for thread in threading.enumerate()
+             if thread.name.startswith('ThreadPoolExecutor')],
+            "Потоки рендера пережили прогрев")
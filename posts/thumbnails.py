@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Post
+from .tasks import task
+from .uploads import downscale
+from . import feed_cache
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_thumbnail(source, target, size):
+    """Обрезать картинку по центру до ``size`` и сохранить в JPEG.
+
+    Выполняется в отдельном процессе, поэтому не трогает Django.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.fit(image.convert('RGB'), size, Image.LANCZOS)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    image.save(target, 'JPEG', quality=85, progressive=True)
+    return image.size
+
+
+def process_upload(source, target, size, max_side):
+    downscale(source, max_side)
+    return render_thumbnail(source, target, size)
+
+
+def source_hash(path):
+    """Короткий хеш содержимого оригинала."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(2 ** 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:8]
+
+
+def thumbnail_name(post):
+    """Имя миниатюры; с новой картинкой у поста меняется и её URL.
+
+    Миниатюры кешируются браузерами и CDN, поэтому перезаписывать файл
+    под старым именем нельзя.
+    """
+    width, height = settings.THUMBNAIL_SIZE
+    return (f'posts/thumbs/{post.pk}_{width}x{height}_'
+            f'{source_hash(post.image.path)}.jpg')
+
+
+def store_thumbnail(post_id, name, size):
+    width, height = size
+    post = Post.objects.filter(pk=post_id)
+    old_name = post.values_list('thumbnail', flat=True).first()
+    post.update(thumbnail=name, thumbnail_width=width,
+                thumbnail_height=height)
+    if old_name and old_name != name:
+        default_storage.delete(old_name)
+    row = post.values_list('author_id', 'group_id').first()
+    if row is not None:
+        feed_cache.bump(*feed_cache.post_scopes(*row))
+        feed_cache.bump_author_followers(row[0])
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(settings.THUMBNAIL_WORKERS or None)
+        return _pool
+
+
+def generate(post):
+    name = thumbnail_name(post)
+    size = process_upload(post.image.path, default_storage.path(name),
+                          settings.THUMBNAIL_SIZE,
+                          settings.POST_IMAGE_MAX_SIDE)
+    store_thumbnail(post.pk, name, size)
+    return name
+
+
+@task(priority=5)
+def build_thumbnail(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None and post.image:
+        generate(post)
+
+
+def schedule(post):
+    """Ужать оригинал и построить миниатюру в очереди задач после коммита.
+
+    При ``THUMBNAIL_WORKERS = 0`` всё делается сразу, в запросе.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post)
+        return
+    build_thumbnail.delay(post.pk, dedup_key=f'thumbnail:{post.pk}')
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Follow, Post, TimelineEntry
+from .tasks import task
+from . import feed_cache
+
+BATCH_SIZE = 1000
+
+
+def _entries(post, user_ids):
+    return [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in user_ids]
+
+
+def _write_batch(post, user_ids):
+    TimelineEntry.objects.bulk_create(_entries(post, user_ids),
+                                      ignore_conflicts=True)
+    feed_cache.bump_followers(user_ids)
+
+
+def _bulk_fan_out(post, follower_ids):
+    batch = []
+    for user_id in follower_ids:
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            _write_batch(post, batch)
+            batch = []
+    if batch:
+        _write_batch(post, batch)
+
+
+@task(priority=10)
+def fan_out_in_background(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        follower_ids = (Follow.objects.filter(author_id=post.author_id)
+                        .values_list('user_id', flat=True)
+                        .iterator(chunk_size=BATCH_SIZE))
+        _bulk_fan_out(post, follower_ids)
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора.
+
+    Небольшие аудитории обрабатываются сразу, для авторов с большим
+    числом подписчиков после коммита ставится задача в очередь.
+    """
+    followers = Follow.objects.filter(author_id=post.author_id)
+    limit = settings.TIMELINE_SYNC_FANOUT_LIMIT
+    follower_ids = list(followers.values_list('user_id', flat=True)
+                        [:limit + 1])
+    if len(follower_ids) <= limit:
+        _bulk_fan_out(post, follower_ids)
+        return
+    fan_out_in_background.delay(post.pk, dedup_key=f'fan_out:{post.pk}')
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту нового подписчика последние посты автора."""
+    recent = (Post.objects.filter(author_id=author_id)
+              .order_by('-pub_date', '-id')
+              .values_list('id', 'pub_date')
+              [:settings.TIMELINE_BACKFILL_SIZE])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in recent],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    feed_cache.bump(f'follower:{user_id}')
+
+
+def backfill_many(user_id, author_ids):
+    """Как ``backfill``, но сразу для нескольких авторов одним запросом.
+
+    INSERT ... SELECT берёт у каждого автора ``TIMELINE_BACKFILL_SIZE``
+    последних постов через ROW_NUMBER() по автору.
+    """
+    db = router.db_for_write(TimelineEntry)
+    ops = connections[db].ops
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    sql = (f'{ops.insert_statement(ignore_conflicts=True)} '
+           f'{ops.quote_name(TimelineEntry._meta.db_table)} '
+           f'(user_id, post_id, pub_date) '
+           f'SELECT %s, id, pub_date FROM ('
+           f'SELECT id, pub_date, ROW_NUMBER() OVER ('
+           f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) AS n '
+           f'FROM {ops.quote_name(Post._meta.db_table)} '
+           f'WHERE author_id IN ({placeholders})) AS recent '
+           f'WHERE n <= %s '
+           f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}')
+    with connections[db].cursor() as cursor:
+        cursor.execute(sql, [user_id, *author_ids,
+                             settings.TIMELINE_BACKFILL_SIZE])
+    feed_cache.bump(f'follower:{user_id}')
+
+
+def entries(user):
+    """Записи ленты подписок в порядке индекса (user, -pub_date, -post)."""
+    return (TimelineEntry.objects.filter(user=user)
+            .only('pub_date', 'post_id')
+            .order_by('-pub_date', '-post_id'))
+
+
+def page_posts(entries, posts=None):
+    """Посты для записей одной страницы ленты, в порядке записей."""
+    entries = list(entries)
+    if posts is None:
+        posts = Post.objects.for_feed()
+    found = posts.in_bulk([entry.post_id for entry in entries])
+    return [found[entry.post_id] for entry in entries
+            if entry.post_id in found]
+
+
+def remove(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+    feed_cache.bump(f'follower:{user_id}')
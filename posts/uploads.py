@@ -0,0 +1,89 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск кусками и отбрасывает слишком большие файлы.
+
+    Размер картинки в пикселях читается из заголовка, до декодирования.
+    Отклонённый файл обрезается до нуля байт, а причина сохраняется в
+    атрибуте ``rejection``, чтобы форма показала её пользователю.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejection = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejection:
+            return None
+        self.received += len(raw_data)
+        max_bytes = settings.POST_IMAGE_MAX_BYTES
+        if self.received > max_bytes:
+            self.rejection = (f'Файл больше {max_bytes // 2 ** 20} МБ, '
+                              f'загрузите картинку поменьше')
+            self.file.seek(0)
+            self.file.truncate()
+            return None
+        self.file.write(raw_data)
+        return None
+
+    def _check_pixels(self):
+        max_pixels = settings.POST_IMAGE_MAX_PIXELS
+        self.file.seek(0)
+        try:
+            with Image.open(self.file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            width = height = max_pixels
+        except Exception:
+            return
+        if width * height > max_pixels:
+            self.rejection = (f'Картинка больше {max_pixels // 10 ** 6} '
+                              f'мегапикселей, загрузите картинку поменьше')
+            self.file.seek(0)
+            self.file.truncate()
+
+    def file_complete(self, file_size):
+        if self.rejection is None:
+            self._check_pixels()
+        self.file.rejection = self.rejection
+        if self.rejection:
+            file_size = 0
+        return super().file_complete(file_size)
+
+
+def bounded_image_uploads(view):
+    """Принимать файлы во ``view`` через ``BoundedImageUploadHandler``.
+
+    Обработчики меняются только у этого запроса и до чтения
+    ``request.FILES``. CsrfViewMiddleware разбирает тело раньше view,
+    поэтому проверка CSRF переносится внутрь, после замены обработчиков.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
+
+
+def downscale(path, max_side):
+    """Ужать оригинал на месте, если его длинная сторона больше max_side."""
+    with Image.open(path) as image:
+        if max(image.size) <= max_side:
+            return image.size
+        image_format = image.format
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(path, image_format, quality=90)
+        return image.size
@@ -1,35 +1,66 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, User, Comment, Follow
+from .models import Post, Group, User, Comment, Follow, UserStats
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from .conditional import FeedValidators
+from .pagination import (COMMENTS_PER_PAGE, CursorPaginator,
+                         far_page_redirect, paginate)
+from .search import search as search_posts
+from .uploads import bounded_image_uploads
+from . import timeline
+
+MAX_BULK_FOLLOW = 100
 
 
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page,
-               'paginator': paginator,
-               }
-    return render(request, 'index.html', context)
+    far_page = far_page_redirect(request)
+    if far_page:
+        return far_page
+    validators = FeedValidators(request, 'index')
+    if validators.not_modified:
+        return validators.not_modified
+    post_list = Post.objects.for_feed()
+    context = paginate(request, post_list, scope='index', approximate=True)
+    return validators.apply(render(request, 'index.html', context))
 
 
 def group_posts(request, slug):
+    far_page = far_page_redirect(request)
+    if far_page:
+        return far_page
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts_group.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page,
-               'paginator': paginator,
+    validators = FeedValidators(request, f'group:{group.pk}')
+    if validators.not_modified:
+        return validators.not_modified
+    posts = group.posts_group.for_feed()
+    context = paginate(request, posts, scope=f'group:{group.pk}')
+    context['group'] = group
+    return validators.apply(render(request, 'group.html', context))
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    page = search_posts(query, group=group, author=author,
+                        after=request.GET.get('after'))
+    params = request.GET.copy()
+    params.pop('after', None)
+    context = {'query': query,
                'group': group,
+               'author': author,
+               'page': page,
+               'params': params.urlencode(),
                }
-    return render(request, 'group.html', context)
+    return render(request, 'search.html', context)
 
 
 @login_required
+@bounded_image_uploads
 def new_post(request):
     if request.method != 'POST':
         form = PostForm()
@@ -48,42 +79,73 @@ def new_post(request):
 
 
 def profile(request, username):
+    far_page = far_page_redirect(request)
+    if far_page:
+        return far_page
     viewer = request.user
-    page_user = get_object_or_404(User, username=username)
-    posts = page_user.posts.all()
-    first_post = page_user.posts.first()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page_user = get_object_or_404(User.objects.select_related('stats'),
+                                  username=username)
+    validators = FeedValidators(request, f'author:{page_user.pk}')
+    if validators.not_modified:
+        return validators.not_modified
+    posts = page_user.posts.for_feed()
+    first_post = posts.first()
     if viewer.is_authenticated:
         following = viewer.follower.filter(author=page_user)
     else:
         following = False
-    context = {'page_user': page_user,
-               'page': page,
-               'post': first_post,
-               'paginator': paginator,
-               'viewer': viewer,
-               'following': following,
-               }
-    return render(request, 'profile.html', context)
+    context = paginate(request, posts, scope=f'author:{page_user.pk}')
+    context.update({'page_user': page_user,
+                    'stats': UserStats.of(page_user),
+                    'post': first_post,
+                    'viewer': viewer,
+                    'following': following,
+                    })
+    return validators.apply(render(request, 'profile.html', context))
 
 
 def post_view(request, username, post_id):
     viewer = request.user
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(Post.objects.for_feed()
+                             .select_related('author__stats'),
+                             author__username=username, id=post_id)
+    request.feed_scopes = (f'author:{post.author_id}',)
+    # ленивый QuerySet всех комментариев: его ждут в контексте страницы,
+    # а показывается только порция из comment_page
+    comments = post.comments.select_related('author')
     form = CommentForm()
     context = {
         'page_user': post.author,
+        'stats': UserStats.of(post.author),
         'post': post,
         'viewer': viewer,
         'comments': comments,
+        'comment_page': _comment_page(request, comments),
         'form': form
     }
     return render(request, 'post.html', context)
 
 
+def _comment_page(request, comments):
+    """Порция комментариев от новых к старым после курсора ``?after=``."""
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE,
+                                date_field='created')
+    return paginator.get_page(after=request.GET.get('after'))
+
+
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев для подгрузки без перезагрузки."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             author__username=username, id=post_id)
+    context = {
+        'page_user': post.author,
+        'post': post,
+        'comment_page': _comment_page(
+            request, post.comments.select_related('author')),
+    }
+    return render(request, 'comment_list.html', context)
+
+
 @login_required
 def add_comment(request, username, post_id):
     viewer = request.user
@@ -102,6 +164,7 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@bounded_image_uploads
 def post_edit(request, username, post_id):
     instance = get_object_or_404(Post, author__username=username, pk=post_id)
     if instance.author != request.user:
@@ -120,15 +183,13 @@ def post_edit(request, username, post_id):
 
 @login_required
 def follow_index(request):
+    far_page = far_page_redirect(request)
+    if far_page:
+        return far_page
     viewer = request.user
-    followings = User.objects.filter(following__user=viewer)
-    post_list = Post.objects.filter(author__in=followings)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page,
-               'paginator': paginator,
-               }
+    context = paginate(request, timeline.entries(viewer),
+                       scope=f'follower:{viewer.pk}', id_field='post_id',
+                       load=timeline.page_posts)
     return render(request, 'follow_index.html', context)
 
 
@@ -137,10 +198,9 @@ def profile_follow(request, username):
     viewer = request.user
     author = get_object_or_404(User, username=username)
 
-    if viewer == author or viewer.follower.filter(author=author).exists():
-        return redirect('profile', username=username)
-
-    Follow.objects.create(user=viewer, author=author)
+    if viewer != author:
+        with transaction.atomic():
+            Follow.objects.follow(viewer, author)
     return redirect('profile', username=username)
 
 
@@ -149,14 +209,29 @@ def profile_unfollow(request, username):
     viewer = request.user
     author = get_object_or_404(User, username=username)
 
-    if viewer == author or not viewer.follower.filter(author=author).exists():
-        return redirect('profile', username=username)
-
-    on_delete = Follow.objects.get(user=viewer, author=author)
-    on_delete.delete()
+    with transaction.atomic():
+        Follow.objects.unfollow(viewer, author)
     return redirect('profile', username=username)
 
 
+@login_required
+def follow_many(request):
+    """Подписаться сразу на несколько авторов, например при онбординге.
+
+    Принимает POST с повторяющимся полем ``username``; незнакомые имена,
+    сам пользователь и уже оформленные подписки пропускаются.
+    """
+    if request.method != 'POST':
+        return redirect('follow_index')
+    viewer = request.user
+    names = request.POST.getlist('username')[:MAX_BULK_FOLLOW]
+    author_ids = (User.objects.filter(username__in=names)
+                  .values_list('pk', flat=True))
+    with transaction.atomic():
+        Follow.objects.follow_many(viewer, author_ids)
+    return redirect('follow_index')
+
+
 def page_not_found(request, exception):
     return render(request, "misc/404.html", {"path": request.path}, status=404)
 
@@ -0,0 +1,190 @@
+"""Прогрев процесса и кешей после деплоя.
+
+``warmup`` компилирует все шаблоны проекта, заполняет URL-резолвер,
+ставит в очередь задач недостающие миниатюры постов с первых страниц
+(их строят воркеры ``run_workers``, а не процесс веб-сервера) и рендерит
+анонимом первые страницы главной, самых больших сообществ и самых
+популярных авторов. Ответы проходят весь стек middleware, поэтому
+попадают в кеш страниц и карточек так же, как при обычном запросе.
+
+Шаблоны, резолвер и L1-кеш живут в памяти процесса: чтобы прогреть
+их у воркера, включите ``WARMUP_ON_START`` (см. ``yatube/wsgi.py``).
+Команда ``manage.py warmup`` прогревает только общий кеш.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.handlers.base import BaseHandler
+from django.db import connections
+from django.db.models import Count
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.test import RequestFactory
+from django.urls import Resolver404, get_resolver, resolve, reverse
+
+from . import benchmark, thumbnails
+from .models import Group, Post, UserStats
+from .pagination import NUMBERED_PAGES, PER_PAGE
+
+
+def template_names():
+    """Имена всех шаблонов из папок проекта, без шаблонов библиотек."""
+    names = set()
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = str(directory)
+            if not directory.startswith(str(settings.BASE_DIR)):
+                continue
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(('.html', '.txt')):
+                        path = os.path.join(root, name)
+                        names.add(os.path.relpath(path, directory))
+    return sorted(names)
+
+
+def load_templates():
+    """Скомпилировать шаблоны; вернуть число загруженных и ошибки."""
+    loaded = 0
+    errors = []
+    for name in template_names():
+        for engine in engines.all():
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError as error:
+                errors.append(f'{name}: {error}')
+            except TemplateDoesNotExist:
+                continue
+            loaded += 1
+            break
+    return loaded, errors
+
+
+def resolve_routes():
+    """Заполнить резолвер и разрешить URL каждого именованного маршрута."""
+    get_resolver().reverse_dict
+    objects = benchmark.sample_objects()
+    if objects['author'] is None:
+        return 0
+    resolved = 0
+    for name, params in benchmark.named_routes():
+        url = benchmark.route_url(name, params, objects)
+        if url is None:
+            continue
+        try:
+            resolve(url.split('?')[0])
+        except Resolver404:
+            continue
+        resolved += 1
+    return resolved
+
+
+def busiest_groups(limit):
+    return list(Group.objects.annotate(total=Count('posts_group'))
+                .order_by('-total', 'pk')[:limit])
+
+
+def busiest_authors(limit):
+    return [stats.user for stats in UserStats.objects
+            .select_related('user')
+            .order_by('-followers_count', '-posts_count', 'pk')[:limit]]
+
+
+def page_urls(pages, groups, authors):
+    urls = [reverse('index') + (f'?page={number}' if number > 1 else '')
+            for number in range(1, pages + 1)]
+    urls += [reverse('group_posts', args=[group.slug]) for group in groups]
+    urls += [reverse('profile', args=[author.username])
+             for author in authors]
+    return urls
+
+
+def missing_thumbnails(pages, groups, authors):
+    """Посты с первых страниц, у которых есть картинка, но нет миниатюры."""
+    posts = list(Post.objects.all()[:pages * PER_PAGE])
+    for group in groups:
+        posts += group.posts_group.all()[:PER_PAGE]
+    for author in authors:
+        posts += author.posts.all()[:PER_PAGE]
+    unique = {post.pk: post for post in posts if post.image}
+    return [post for post in unique.values()
+            if not post.thumbnail
+            or not default_storage.exists(post.thumbnail)]
+
+
+def queue_thumbnails(posts):
+    """Поставить построение миниатюр в очередь; вернуть число постов."""
+    for post in posts:
+        thumbnails.build_thumbnail.delay(post.pk,
+                                         dedup_key=f'thumbnail:{post.pk}')
+    return len(posts)
+
+
+class _Renderer:
+    """Прогоняет GET-запросы через весь стек middleware без сервера."""
+
+    def __init__(self, host, deadline):
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+        self.factory = RequestFactory(HTTP_HOST=host)
+        self.deadline = deadline
+
+    def __call__(self, url):
+        if time.monotonic() > self.deadline:
+            return None
+        try:
+            return self.handler.get_response(self.factory.get(url))
+        finally:
+            connections.close_all()
+
+
+def render_pages(urls, host, workers, deadline):
+    """Отрендерить ``urls`` параллельно; вернуть {url: статус или None}."""
+    render = _Renderer(host, deadline)
+    executor = ThreadPoolExecutor(max(workers, 1))
+    try:
+        futures = {executor.submit(render, url): url for url in urls}
+        finished, pending = wait(futures,
+                                 max(deadline - time.monotonic(), 0))
+        for future in pending:
+            future.cancel()
+    finally:
+        # уже начатые страницы дорендериваются, потоки не переживают прогрев
+        executor.shutdown(wait=True)
+    statuses = dict.fromkeys(urls)
+    for future in finished:
+        response = future.result() if future.exception() is None else None
+        if response is not None:
+            statuses[futures[future]] = response.status_code
+    return statuses
+
+
+def warmup(pages=None, groups=None, profiles=None, budget=None,
+           workers=None, host=None):
+    """Прогреть шаблоны, маршруты, миниатюры и страницы за ``budget`` секунд.
+
+    Параметры по умолчанию берутся из настроек ``WARMUP_*``. Страницы,
+    не успевшие отрендериться за отведённое время, пропускаются.
+    """
+    pages = min(settings.WARMUP_PAGES if pages is None else pages,
+                NUMBERED_PAGES)
+    groups = settings.WARMUP_GROUPS if groups is None else groups
+    profiles = settings.WARMUP_PROFILES if profiles is None else profiles
+    budget = settings.WARMUP_BUDGET if budget is None else budget
+    workers = settings.WARMUP_WORKERS if workers is None else workers
+    host = host or settings.ALLOWED_HOSTS[0]
+    deadline = time.monotonic() + budget
+
+    loaded, errors = load_templates()
+    report = {'templates': loaded, 'template_errors': errors,
+              'routes': resolve_routes()}
+    groups = busiest_groups(groups)
+    authors = busiest_authors(profiles)
+    report['thumbnails'] = queue_thumbnails(
+        missing_thumbnails(pages, groups, authors))
+    report['pages'] = render_pages(page_urls(pages, groups, authors),
+                                   host, workers, deadline)
+    report['seconds'] = round(budget - (deadline - time.monotonic()), 3)
+    return report
@@ -1,5 +1,8 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
 from django.contrib.auth import get_user_model
+from django.contrib.sites.shortcuts import get_current_site
+
+from .tasks import send_password_reset
 
 
 User = get_user_model()
@@ -9,3 +12,21 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Письмо для сброса пароля собирает и отправляет воркер очереди.
+
+    В задачу попадают только id пользователя и адрес сайта из запроса,
+    ссылку с токеном воркер строит сам (см. users/tasks.py).
+    """
+
+    def save(self, domain_override=None, use_https=False, request=None,
+             **kwargs):
+        if domain_override:
+            site_name = domain = domain_override
+        else:
+            current_site = get_current_site(request)
+            site_name, domain = current_site.name, current_site.domain
+        for user in self.get_users(self.cleaned_data['email']):
+            send_password_reset.delay(user.pk, domain, site_name, use_https)
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.tasks import task
+
+User = get_user_model()
+
+SUBJECT_TEMPLATE = 'registration/password_reset_subject.txt'
+EMAIL_TEMPLATE = 'registration/password_reset_email.html'
+
+
+@task(priority=20, max_attempts=8)
+def send_password_reset(user_id, domain, site_name, use_https):
+    """Собрать и отправить письмо со ссылкой для сброса пароля.
+
+    Одноразовый токен создаётся здесь, в воркере: в очереди лежат только
+    id пользователя и адрес сайта.
+    """
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return
+    email = getattr(user, User.get_email_field_name())
+    context = {
+        'email': email,
+        'domain': domain,
+        'site_name': site_name,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'user': user,
+        'token': default_token_generator.make_token(user),
+        'protocol': 'https' if use_https else 'http',
+    }
+    PasswordResetForm().send_mail(SUBJECT_TEMPLATE, EMAIL_TEMPLATE, context,
+                                  None, email)
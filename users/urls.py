@@ -1,6 +1,12 @@
+from django.contrib.auth import views as auth_views
 from django.urls import path
 from . import views
+from .forms import QueuedPasswordResetForm
 
 urlpatterns = [
-    path("signup/", views.SignUp.as_view(), name="signup")
+    path("signup/", views.SignUp.as_view(), name="signup"),
+    path("password_reset/",
+         auth_views.PasswordResetView.as_view(
+             form_class=QueuedPasswordResetForm),
+         name="password_reset"),
 ]
@@ -0,0 +1,331 @@
+"""Двухуровневый кеш: небольшой LRU в памяти процесса перед общим кешем.
+
+Значения хранятся в общем кеше (L2) в обёртке вместе с мягким сроком
+годности и временем их вычисления. Истёкшее значение ещё живёт в L2
+``STALE_TIMEOUT`` секунд: пока один процесс пересчитывает его, остальные
+получают старую версию. Пересчёт начинается заранее с вероятностью,
+растущей к концу срока (probabilistic early expiration), поэтому горячий
+ключ не истекает одновременно во всех процессах.
+
+L1 один на процесс для каждого общего кеша: ``caches[...]`` создаёт
+свой экземпляр бэкенда в каждом потоке, а LRU общий для всех них. Об
+удалениях в других процессах L1 не узнаёт: удалённый или изменённый там
+ключ ещё до ``L1_TIMEOUT`` секунд читается по-старому. Ключи с
+префиксами из ``L1_BYPASS`` (версии лент) читаются только из L2.
+
+Блокировка пересчёта хранит токен владельца, и снимает её только тот
+экземпляр, который её взял.
+"""
+import math
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+from .metrics import timed
+
+LOCK_PREFIX = 'lock:'
+INCR_LOCK_PREFIX = 'incr:'
+MAX_PENDING_MISSES = 10000
+
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+class LocalLRU:
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, payload = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        return pickle.loads(payload)
+
+    def set(self, key, entry, timeout):
+        payload = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def local_cache(name, max_entries):
+    """LRU процесса перед общим кешем ``name``, один на все потоки."""
+    with _local_caches_lock:
+        if name not in _local_caches:
+            _local_caches[name] = LocalLRU(max_entries)
+        return _local_caches[name]
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', location or 'shared')
+        self.local = local_cache(self._shared_alias,
+                                 int(options.get('L1_MAX_ENTRIES', 1000)))
+        self.local_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.local_bypass = tuple(options.get('L1_BYPASS', ()))
+        self.stale_timeout = int(options.get('STALE_TIMEOUT', 60))
+        self.lock_timeout = int(options.get('LOCK_TIMEOUT', 30))
+        self.lock_wait = float(options.get('LOCK_WAIT', 2))
+        self.beta = float(options.get('BETA', 1))
+        self._misses = {}
+        self._held_locks = {}
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _entry(self, key, version):
+        entry = None
+        if not key.startswith(self.local_bypass):
+            entry = self.local.get(self._local_key(key, version))
+        if entry is None:
+            entry = self.shared.get(key, version=version)
+            if entry is not None:
+                self._remember_locally(key, version, entry)
+        return entry
+
+    def _remember_locally(self, key, version, entry):
+        if key.startswith(self.local_bypass):
+            return
+        _, expires, _ = entry
+        timeout = self.local_timeout
+        if expires is not None:
+            timeout = min(timeout, expires - time.time())
+        if timeout > 0:
+            self.local.set(self._local_key(key, version), entry, timeout)
+
+    def _should_refresh(self, expires, delta):
+        if expires is None:
+            return False
+        early = delta * self.beta * -math.log(1 - random.random())
+        return time.time() + early >= expires
+
+    def _lock(self, key, version):
+        lock_key = self.make_key(LOCK_PREFIX + key, version=version)
+        token = uuid.uuid4().hex
+        if not self.shared.add(LOCK_PREFIX + key, token, self.lock_timeout,
+                               version=version):
+            return False
+        if len(self._held_locks) >= MAX_PENDING_MISSES:
+            self._held_locks.clear()
+        self._held_locks[lock_key] = token
+        return True
+
+    def _unlock(self, key, version):
+        """Снять блокировку, если её взял этот экземпляр.
+
+        Истёкшую блокировку мог перехватить другой процесс, поэтому она
+        удаляется, только пока в ней наш токен.
+        """
+        lock_key = self.make_key(LOCK_PREFIX + key, version=version)
+        token = self._held_locks.pop(lock_key, None)
+        if token is None:
+            return
+        if self.shared.get(LOCK_PREFIX + key, version=version) == token:
+            self.shared.delete(LOCK_PREFIX + key, version=version)
+
+    @contextmanager
+    def _exclusive(self, key, version):
+        """Блокировка ключа на время чтения-изменения-записи в L2."""
+        deadline = time.monotonic() + self.lock_wait
+        while not self._lock(INCR_LOCK_PREFIX + key, version):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Key '{key}' is locked")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._unlock(INCR_LOCK_PREFIX + key, version)
+
+    def _miss(self, key, version, default):
+        if len(self._misses) >= MAX_PENDING_MISSES:
+            self._misses.clear()
+        self._misses[self.make_key(key, version=version)] = time.time()
+        return default
+
+    @timed('cache')
+    def get(self, key, default=None, version=None):
+        entry = self._entry(key, version)
+        if entry is None:
+            return self._miss(key, version, default)
+        value, expires, delta = entry
+        if self._should_refresh(expires, delta) and self._lock(key, version):
+            return self._miss(key, version, default)
+        return value
+
+    @timed('cache')
+    def get_many(self, keys, version=None):
+        values = {}
+        for key in keys:
+            entry = self._entry(key, version)
+            if entry is not None:
+                values[key] = entry[0]
+        return values
+
+    def _envelope(self, key, value, timeout, version):
+        started = self._misses.pop(self.make_key(key, version=version), None)
+        delta = time.time() - started if started else 0
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return (value, None, delta), None
+        return (value, time.time() + timeout, delta), (
+            timeout + self.stale_timeout)
+
+    @timed('cache')
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry, shared_timeout = self._envelope(key, value, timeout, version)
+        self.shared.set(key, entry, shared_timeout, version=version)
+        self._remember_locally(key, version, entry)
+        self._unlock(key, version)
+
+    @timed('cache')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry, shared_timeout = self._envelope(key, value, timeout, version)
+        added = self.shared.add(key, entry, shared_timeout, version=version)
+        if added:
+            self._remember_locally(key, version, entry)
+        return added
+
+    @timed('cache')
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        """Вычислить значение не больше одного раза на все процессы.
+
+        Если ключа нет совсем, остальные процессы ждут до ``LOCK_WAIT``
+        секунд, пока первый не положит результат.
+        """
+        entry = self._entry(key, version)
+        if entry is not None:
+            value, expires, delta = entry
+            if not (self._should_refresh(expires, delta)
+                    and self._lock(key, version)):
+                return value
+        elif not self._lock(key, version):
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = self.shared.get(key, version=version)
+                if entry is not None:
+                    return entry[0]
+        self._miss(key, version, None)
+        try:
+            value = default() if callable(default) else default
+        except Exception:
+            self._unlock(key, version)
+            raise
+        self.set(key, value, timeout, version=version)
+        return value
+
+    @timed('cache')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        entry = self._entry(key, version)
+        if entry is None:
+            return False
+        self.set(key, entry[0], timeout, version=version)
+        return True
+
+    @timed('cache')
+    def incr(self, key, delta=1, version=None):
+        with self._exclusive(key, version):
+            entry = self.shared.get(key, version=version)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            value, expires, cost = entry
+            value += delta
+            timeout = (None if expires is None
+                       else max(expires - time.time(), 0))
+            self.shared.set(key, (value, expires, cost),
+                            None if timeout is None
+                            else timeout + self.stale_timeout,
+                            version=version)
+        self.local.delete(self._local_key(key, version))
+        return value
+
+    @timed('cache')
+    def delete(self, key, version=None):
+        """Удалить ключ; L1 других процессов узнает об этом по таймауту."""
+        self.local.delete(self._local_key(key, version))
+        self.shared.delete(key, version=version)
+
+    @timed('cache')
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    @timed('cache')
+    def has_key(self, key, version=None):
+        return self._entry(key, version) is not None
+
+    @timed('cache')
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class FileCache(FileBasedCache):
+    """Файловый кеш, у которого ``add`` атомарен между процессами.
+
+    Файл со значением пишется во временный и ставится на место через
+    ``os.link``: ссылка не создаётся, если ключ уже есть, поэтому из
+    нескольких процессов ключ блокировки получает ровно один.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            # истёкший файл has_key удалит, после чего пробуем ещё раз
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                except FileExistsError:
+                    if self.has_key(key, version):
+                        return False
+                    continue
+                return True
+            return False
+        finally:
+            os.remove(tmp_path)
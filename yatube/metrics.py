@@ -0,0 +1,255 @@
+"""Замер запросов: время в SQL, шаблонах и кеше.
+
+``MetricsMiddleware`` собирает время каждого запроса, отдаёт его в
+заголовке ``Server-Timing`` и копит гистограммы по именам маршрутов в
+памяти процесса. Их в формате Prometheus отдаёт представление
+``metrics``. У каждого процесса свои гистограммы: сервер метрик должен
+опрашивать все процессы либо суммировать их на своей стороне.
+
+Время считается без вложенных замеров: если внутри рендеринга шаблона
+выполнился SQL, он попадёт только в ``db``, а не ещё и в ``tpl``.
+"""
+import bisect
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.decorators import user_passes_test
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (DjangoTemplates, Template,
+                                             reraise)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+PARTS = ('db', 'tpl', 'cache')
+UNNAMED = 'unnamed'
+
+_state = threading.local()
+
+
+class Timings:
+    """Время частей одного запроса в секундах."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PARTS, 0.0)
+        self.queries = 0
+        self._nested = 0.0
+
+    def measure(self, part, func, *args, **kwargs):
+        outer_nested, self._nested = self._nested, 0.0
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.totals[part] += elapsed - self._nested
+            self._nested = outer_nested + elapsed
+
+    def sql(self, execute, sql, params, many, context):
+        self.queries += 1
+        return self.measure('db', execute, sql, params, many, context)
+
+
+def measure(part, func, *args, **kwargs):
+    """Выполнить ``func``, записав время в часть ``part`` текущего запроса."""
+    timings = getattr(_state, 'timings', None)
+    if timings is None:
+        return func(*args, **kwargs)
+    return timings.measure(part, func, *args, **kwargs)
+
+
+def timed(part):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            return measure(part, method, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield format_number(bound), total
+        yield '+Inf', total + self.counts[-1]
+
+
+class Registry:
+    """Гистограммы и счётчики по маршрутам, общие для потоков процесса."""
+
+    metrics = (
+        ('duration', 'Полное время обработки запроса'),
+        ('db', 'Время в SQL-запросах'),
+        ('tpl', 'Время рендеринга шаблонов'),
+        ('cache', 'Время обращений к кешу'),
+    )
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {name: {} for name, _ in self.metrics}
+        self.queries = {}
+        self.responses = {}
+        self.page_cache = {}
+
+    def observe(self, view, status, duration, timings):
+        values = dict(timings.totals, duration=duration)
+        with self._lock:
+            for name, histograms in self.histograms.items():
+                histogram = histograms.get(view)
+                if histogram is None:
+                    histogram = histograms[view] = Histogram(self.buckets)
+                histogram.observe(values[name])
+            self.queries[view] = self.queries.get(view, 0) + timings.queries
+            key = (view, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def count_page_cache(self, view, result):
+        key = (view, result)
+        with self._lock:
+            self.page_cache[key] = self.page_cache.get(key, 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, description in self.metrics:
+                metric = f'yatube_request_{name}_seconds'
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} histogram')
+                for view, histogram in sorted(self.histograms[name].items()):
+                    label = f'view="{escape(view)}"'
+                    for bound, count in histogram.samples():
+                        lines.append(
+                            f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{{label}}} '
+                                 f'{format_number(histogram.sum)}')
+                    lines.append(f'{metric}_count{{{label}}} '
+                                 f'{sum(histogram.counts)}')
+            lines.append('# HELP yatube_sql_queries_total '
+                         'Число SQL-запросов')
+            lines.append('# TYPE yatube_sql_queries_total counter')
+            for view, count in sorted(self.queries.items()):
+                lines.append(f'yatube_sql_queries_total'
+                             f'{{view="{escape(view)}"}} {count}')
+            lines.append('# HELP yatube_responses_total Число ответов')
+            lines.append('# TYPE yatube_responses_total counter')
+            for (view, status), count in sorted(self.responses.items()):
+                lines.append(f'yatube_responses_total{{view="{escape(view)}",'
+                             f'status="{status}"}} {count}')
+            lines.append('# HELP yatube_page_cache_total '
+                         'Обращения к кешу страниц: hit, miss, bypass')
+            lines.append('# TYPE yatube_page_cache_total counter')
+            for (view, result), count in sorted(self.page_cache.items()):
+                lines.append(f'yatube_page_cache_total{{view="{escape(view)}",'
+                             f'result="{result}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_number(value):
+    return repr(float(value))
+
+
+registry = Registry(getattr(settings, 'METRICS_BUCKETS', DEFAULT_BUCKETS))
+
+
+def current_view():
+    """Имя маршрута запроса, который сейчас обрабатывает этот поток."""
+    return getattr(_state, 'view', None)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNNAMED
+    return match.view_name if match.url_name else UNNAMED
+
+
+class MetricsMiddleware:
+    """Замеряет запрос целиком; должен стоять первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _state.timings = Timings()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.sql))
+                response = self.get_response(request)
+        finally:
+            _state.timings = _state.view = None
+        duration = time.perf_counter() - started
+        registry.observe(view_label(request), response.status_code,
+                         duration, timings)
+        response['Server-Timing'] = server_timing(duration, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.view = view_label(request)
+
+
+def server_timing(duration, timings):
+    parts = [f'{part};dur={seconds * 1000:.1f}'
+             for part, seconds in timings.totals.items()]
+    parts[0] += f';desc="{timings.queries} queries"'
+    parts.append(f'total;dur={duration * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        return measure('tpl', super().render, context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, время рендеринга которого попадает в метрики.
+
+    Замеряются только шаблоны верхнего уровня, поэтому {% include %} и
+    {% extends %} не учитываются дважды.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name),
+                                 self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+@user_passes_test(lambda user: user.is_active and user.is_staff)
+def metrics(request):
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,66 @@
+"""Чтение лент с реплики и запись в основную базу.
+
+``ReplicaMiddleware`` разрешает чтение с ``REPLICA_DATABASE`` только для
+GET-запросов к маршрутам из ``REPLICA_VIEWS``, а ``ReplicaRouter`` в
+остальных случаях оставляет всё в основной базе. Если во время запроса
+что-то записалось, клиент получает cookie и ``REPLICA_STICKY_SECONDS``
+секунд читает из основной базы — так автор сразу видит свой пост или
+комментарий, даже если реплика отстаёт.
+
+Локально реплику изображает второй файл SQLite, который команда
+``simulate_replica`` догоняет с заданной задержкой.
+"""
+import threading
+
+from django.conf import settings
+
+STICKY_COOKIE = 'read_primary'
+READ_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'use_replica', False) and not getattr(
+                _state, 'wrote', False):
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.use_replica = _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.use_replica = _state.wrote = False
+        if wrote and replica_alias():
+            response.set_cookie(STICKY_COOKIE, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.use_replica = bool(
+            replica_alias()
+            and request.method in READ_METHODS
+            and request.resolver_match.url_name in settings.REPLICA_VIEWS
+            and STICKY_COOKIE not in request.COOKIES)
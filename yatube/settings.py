@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -65,7 +68,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,8 +87,22 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            # версии лент сбрасываются в других процессах, их L1 не держит
+            'L1_BYPASS': ('feed_version:', 'feed_modified:'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'yatube.cache.FileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        # карточки постов, фрагменты и страницы всех лент; при 300 записях
+        # по умолчанию кеш вычищался бы почти на каждой записи
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 # Database
@@ -95,7 +112,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+    },
+    # локальная «реплика»: копия db.sqlite3, которую догоняет
+    # ./manage.py simulate_replica
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+
+# read replica, see yatube/routers.py; None keeps all reads on default
+
+REPLICA_DATABASE = None
+REPLICA_VIEWS = ('index', 'group_posts', 'profile', 'post_view',
+                 'post_comments', 'follow_index')
+REPLICA_STICKY_SECONDS = 10
+REPLICA_MAX_LAG = 5
+
+# applied to every new SQLite connection, see yatube/sqlite.py
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -161,3 +208,96 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# follow timelines
+
+TIMELINE_SYNC_FANOUT_LIMIT = 500
+TIMELINE_BACKFILL_SIZE = 200
+
+# post thumbnails
+
+THUMBNAIL_SIZE = (960, 339)
+# 0 builds thumbnails inside the request. Otherwise uploads go through the
+# task queue, and thumbnails appear only while ./manage.py run_workers is
+# running; batch commands then use a process pool of this size
+THUMBNAIL_WORKERS = 0
+
+# uploaded post images, checked by posts.uploads.bounded_image_uploads
+
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 24 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+
+# feed pagination
+
+FEED_APPROXIMATE_COUNT_AFTER = 100000
+
+# how long shared caches may serve anonymous feed pages without revalidation
+
+FEED_MAX_AGE = 10
+
+# whole-page cache for anonymous visitors, see posts/page_cache.py
+
+PAGE_CACHE_VIEWS = ('index', 'group_posts', 'profile', 'post_view',
+                    'django.contrib.flatpages.views.flatpage',
+                    'about', 'terms')
+PAGE_CACHE_TIMEOUT = 600
+
+# rendered post cards shared by all feeds, see posts/cards.py
+
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# cache warmup after deploy, see posts/warmup.py and yatube/wsgi.py
+
+WARMUP_ON_START = False
+WARMUP_PAGES = 3
+WARMUP_GROUPS = 5
+WARMUP_PROFILES = 5
+WARMUP_BUDGET = 30
+WARMUP_WORKERS = 4
+
+# background task queue, see posts/tasks.py
+
+TASKS_EAGER = False
+TASK_WORKERS = 2
+TASK_MAX_ATTEMPTS = 5
+TASK_VISIBILITY_TIMEOUT = 300
+TASK_RETRY_DELAY = 5
+TASK_RETRY_MAX_DELAY = 60 * 60
+TASK_POLL_INTERVAL = 1.0
+
+# request metrics, see yatube/metrics.py
+
+METRICS_ENABLED = True
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# slow query log, see yatube/slow_queries.py
+
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'yatube.slow_queries.JsonFormatter'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 2 ** 20,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,137 @@
+"""Журнал медленных SQL-запросов.
+
+Обёртка ``SlowQueryLogger`` ставится на каждое новое соединение с базой
+(см. ``posts.signals``) и пишет в логгер ``yatube.slow_queries`` запросы
+дольше ``SLOW_QUERY_MS`` миллисекунд: текст, параметры, время, маршрут,
+место в коде проекта и план выполнения. ``JsonFormatter`` пишет записи
+по одной JSON-строке, а команда ``slow_query_report`` сводит их по
+отпечаткам запросов.
+"""
+import json
+import logging
+import os
+import re
+import time
+import traceback
+
+from django.conf import settings
+
+from .metrics import current_view
+
+logger = logging.getLogger(__name__)
+
+MAX_PARAM_LENGTH = 200
+EXPLAINABLE = ('SELECT', 'WITH')
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_lists = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_spaces = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Привести запрос к виду без конкретных значений.
+
+    Литералы заменяются на ``%s``, а списки ``IN (%s, %s, ...)`` любой
+    длины — на ``(...)``, чтобы один и тот же запрос с разными
+    аргументами попал в одну группу.
+    """
+    sql = _literals.sub('%s', sql)
+    sql = _lists.sub('(...)', sql)
+    return _spaces.sub(' ', sql).strip()
+
+
+def location():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = frame.filename
+        if (filename.startswith(base) and 'site-packages' not in filename
+                and filename != __file__):
+            return (f'{os.path.relpath(filename, base)}:{frame.lineno} '
+                    f'in {frame.name}')
+    return None
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    # курсор драйвера, чтобы EXPLAIN не попал в обёртки и журнал запросов
+    with connection.cursor() as cursor:
+        try:
+            cursor.cursor.execute(prefix + sql, params)
+            rows = cursor.cursor.fetchall()
+        except Exception as exc:
+            return [f'EXPLAIN не выполнен: {exc}']
+    if connection.vendor == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
+
+
+def clean_params(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: clean_params([value])[0]
+                for key, value in params.items()}
+    cleaned = []
+    for value in params:
+        if isinstance(value, (bytes, memoryview)):
+            value = f'<{len(value)} bytes>'
+        elif not isinstance(value, (int, float, bool, type(None))):
+            value = str(value)[:MAX_PARAM_LENGTH]
+        cleaned.append(value)
+    return cleaned
+
+
+class SlowQueryLogger:
+    """Обёртка ``execute`` для ``connection.execute_wrappers``."""
+
+    def __init__(self, connection, threshold_ms):
+        self.connection = connection
+        self.threshold = threshold_ms / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.log(sql, params, many, duration)
+
+    def log(self, sql, params, many, duration):
+        entry = {
+            'sql': sql,
+            'params': None if many else clean_params(params),
+            'many': many,
+            'duration_ms': round(duration * 1000, 3),
+            'database': self.connection.alias,
+            'view': current_view(),
+            'location': location(),
+            'plan': None if many else explain(self.connection, sql, params),
+        }
+        logger.warning('slow query %.1f ms', entry['duration_ms'],
+                       extra={'slow_query': entry})
+
+
+def install(connection):
+    threshold = getattr(settings, 'SLOW_QUERY_MS', None)
+    if threshold is None:
+        return
+    if any(isinstance(wrapper, SlowQueryLogger)
+           for wrapper in connection.execute_wrappers):
+        return
+    # первой в списке: обёртки execute_wrapper() снимаются через pop()
+    connection.execute_wrappers.insert(
+        0, SlowQueryLogger(connection, threshold))
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = dict(getattr(record, 'slow_query', None)
+                     or {'message': record.getMessage()})
+        entry['time'] = self.formatTime(record, '%Y-%m-%dT%H:%M:%S')
+        return json.dumps(entry, ensure_ascii=False, default=str)
@@ -0,0 +1,35 @@
+"""Настройка соединений SQLite под конкурентную нагрузку.
+
+``apply_pragmas`` выполняется для каждого нового соединения (см.
+``posts.signals``) и применяет ``SQLITE_PRAGMAS`` из настроек. WAL
+позволяет читать во время записи, ``synchronous=NORMAL`` в режиме WAL
+не теряет целостность базы, а ``busy_timeout`` заставляет писателя
+подождать блокировку вместо мгновенного «database is locked».
+"""
+import re
+
+from django.conf import settings
+
+_name = re.compile(r'^[a-z_]+$')
+_value = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(connection, pragmas=None):
+    if connection.vendor != 'sqlite':
+        return
+    if pragmas is None:
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        if not (_name.match(name) and _value.match(str(value))):
+            raise ValueError(f'Недопустимая настройка SQLite: {name}={value}')
+        # мимо обёрток курсора: это служебные запросы, а не запросы view
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def read_pragmas(connection, names):
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
@@ -18,6 +18,7 @@ from django.urls import path, include
 from django.contrib.flatpages import views
 from django.conf import settings
 from django.conf.urls.static import static
+from yatube.metrics import metrics
 from django.conf.urls import handler404, handler500  # noqa
 
 handler404 = 'posts.views.page_not_found'  # noqa
@@ -26,6 +27,8 @@ handler500 = 'posts.views.server_error'  # noqa
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('about/', include('django.contrib.flatpages.urls')),
+    path('metrics', metrics, name='metrics'),
+    path('api/v1/', include('posts.api_urls')),
     path('', include('posts.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Прогреть шаблоны, резолвер и кеши воркера до первого запроса.
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_START:
+    from posts.warmup import warmup
+
+    warmup()